@@ -0,0 +1,165 @@
+import copy
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from google.generativeai import GenerationConfig
+from app.gemini.schema import json_config, parse_json_response, response_schema
+from app.services.resilience import gemini_calls
+
+logger = logging.getLogger(__name__)
+
+# Documents of the same type arriving within GEMINI_BATCH_WAIT_MS of each other are
+# sent in one request of up to GEMINI_BATCH_SIZE images. A size of 1 disables batching.
+GEMINI_BATCH_SIZE = int(os.getenv("GEMINI_BATCH_SIZE", 1))
+GEMINI_BATCH_WAIT_MS = int(os.getenv("GEMINI_BATCH_WAIT_MS", 50))
+
+BATCH_INSTRUCTIONS = """
+
+    You are given {count} separate documents, each preceded by a "Document <index>:" label.
+    Apply the instructions to each document independently and return a JSON array
+    with one object per document, setting "index" to the document's label number.
+    """
+
+_stats_lock = threading.Lock()
+batch_stats = {}
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def batch_config(model) -> GenerationConfig:
+    """Generation config for an array of the model's objects, each tagged with its document index"""
+    item = copy.deepcopy(response_schema(model))
+    item["properties"] = {"index": {"type": "INTEGER"}, **item.get("properties", {})}
+    item["required"] = ["index", *item.get("required", [])]
+    return GenerationConfig(
+        response_mime_type="application/json",
+        response_schema={"type": "ARRAY", "items": item}
+    )
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent calls into batches. Callers block in submit(); the first
+    caller without an active collector collects whatever arrives within max_wait
+    (or until max_batch items are queued), runs the batch on its own thread and
+    hands every caller its result. Batches run concurrently with later collection.
+    """
+
+    def __init__(self, name, run_batch, max_batch=GEMINI_BATCH_SIZE, max_wait=GEMINI_BATCH_WAIT_MS / 1000):
+        self.name = name
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._pending = []
+        self._collecting = False
+        self._cond = threading.Condition()
+
+    def submit(self, item):
+        """Queue an item and return its result once its batch has run"""
+        future = Future()
+        with self._cond:
+            self._pending.append((item, future))
+            self._cond.notify_all()
+            while not future.done():
+                if self._collecting or not self._pending:
+                    self._cond.wait()
+                    continue
+                self._collecting = True
+                batch = self._collect()
+                self._collecting = False
+                # Let a waiting caller start collecting the next batch while this one runs
+                self._cond.notify_all()
+                self._cond.release()
+                try:
+                    self._run(batch)
+                finally:
+                    self._cond.acquire()
+                    self._cond.notify_all()
+        return future.result()
+
+    def _collect(self):
+        deadline = time.monotonic() + self.max_wait
+        while len(self._pending) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._cond.wait(remaining)
+        batch = self._pending[:self.max_batch]
+        del self._pending[:self.max_batch]
+        return batch
+
+    def _run(self, batch):
+        started = time.perf_counter()
+        try:
+            results = self.run_batch([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+        with _stats_lock:
+            stats = batch_stats.setdefault(self.name, {"batches": 0, "documents": 0, "seconds": 0.0})
+            stats["batches"] += 1
+            stats["documents"] += len(batch)
+            stats["seconds"] += time.perf_counter() - started
+
+
+def generate_one(doc_type, model, prompt, image, schema_model) -> dict:
+    """Extract one document with its own request (prompt None when the model carries the instructions)"""
+    contents = [image] if prompt is None else [prompt, image]
+    response = gemini_calls.call(lambda timeout: model.generate_content(
+        contents, generation_config=json_config(schema_model), request_options={"timeout": timeout}
+    ))
+    return parse_json_response(doc_type, response.text, response.usage_metadata)
+
+
+def generate_batch(doc_type, model, prompt, images, schema_model) -> list:
+    """
+    Extract several documents of one type with a single request. Documents the
+    response leaves out are retried on their own, so every caller gets a result.
+    """
+    if len(images) == 1:
+        return [generate_one(doc_type, model, prompt, images[0], schema_model)]
+
+    contents = [(prompt or "") + BATCH_INSTRUCTIONS.format(count=len(images))]
+    for index, image in enumerate(images):
+        contents += [f"Document {index}:", image]
+    response = gemini_calls.call(lambda timeout: model.generate_content(
+        contents, generation_config=batch_config(schema_model), request_options={"timeout": timeout}
+    ))
+    items = parse_json_response(doc_type, response.text, response.usage_metadata, expected=list)
+
+    by_index = {item.pop("index"): item for item in items if isinstance(item, dict) and "index" in item}
+    results = []
+    for index, image in enumerate(images):
+        if index in by_index:
+            results.append(by_index[index])
+        else:
+            logger.warning(f"Batched {doc_type} response had no result for document {index}, retrying it alone")
+            results.append(generate_one(doc_type, model, prompt, image, schema_model))
+    return results
+
+
+def generate_json(doc_type, model, prompt, image, schema_model) -> dict:
+    """
+    Run a structured extraction for one image, coalesced with concurrent
+    extractions of the same document type when GEMINI_BATCH_SIZE > 1
+    """
+    if GEMINI_BATCH_SIZE <= 1:
+        return generate_one(doc_type, model, prompt, image, schema_model)
+    # Only calls sharing a prompt and schema can go in one request
+    key = (doc_type, prompt, schema_model)
+    with _batchers_lock:
+        batcher = _batchers.get(key)
+        if batcher is None:
+            # Items carry the caller's model, which changes when its cached prompt is renewed
+            batcher = _batchers[key] = MicroBatcher(
+                doc_type, lambda items: generate_batch(doc_type, items[0][0], prompt, [image for _, image in items], schema_model),
+                max_batch=GEMINI_BATCH_SIZE, max_wait=GEMINI_BATCH_WAIT_MS / 1000
+            )
+    return batcher.submit((model, image))
@@ -0,0 +1,58 @@
+import logging
+import os
+import threading
+import google.generativeai as genai
+from google import genai as genai_sdk
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Process-wide Gemini clients. The SDK keeps its transport (gRPC channel /
+# keep-alive HTTP connections) on the client, so building it once lets every
+# request reuse the same connections instead of paying setup per call.
+_lock = threading.Lock()
+_configured_key = None
+_pdf_client = None
+
+
+def configure(api_key: str = None):
+    """Configure the Gemini SDK once for the whole process"""
+    global _configured_key
+    api_key = api_key or os.getenv("GEMINI_API_KEY")
+    with _lock:
+        if _configured_key != api_key:
+            genai.configure(api_key=api_key)
+            _configured_key = api_key
+
+
+def get_pdf_client(api_key: str = None) -> genai_sdk.Client:
+    """Return the shared google-genai client used for PDF extraction"""
+    global _pdf_client
+    with _lock:
+        if _pdf_client is None:
+            _pdf_client = genai_sdk.Client(api_key=api_key or os.getenv("GEMINI_API_KEY"))
+        return _pdf_client
+
+
+def startup():
+    """Configure the SDK and create the shared PDF client at application startup"""
+    configure()
+    get_pdf_client()
+    logger.info("Gemini clients ready")
+
+
+def shutdown():
+    """Release the shared clients and their pooled connections"""
+    global _pdf_client, _configured_key
+    with _lock:
+        if _pdf_client is not None:
+            close = getattr(_pdf_client, "close", None)
+            if close is not None:
+                try:
+                    close()
+                except Exception as e:
+                    logger.warning(f"Failed to close Gemini PDF client: {str(e)}")
+            _pdf_client = None
+        _configured_key = None
@@ -1,41 +1,45 @@
-import base64
 import os
-import json
+import time
 from dotenv import load_dotenv
-from google import genai
 from google.genai import types
 from typing import Union, BinaryIO
+from app.services.executor import run_blocking
+from app.services.resilience import gemini_calls
+from app.gemini.client import get_pdf_client
+from app.gemini.schema import parse_json_response
+from app.gemini.text_layer import extract_text_fields, merge_fields, record_vision_fallback
+from app.models.document import Document
 
 load_dotenv()
 
+MODEL_NAME = "gemini-2.0-flash"
+# Bump whenever the prompt or schema changes so cached results are not reused
+PROMPT_VERSION = "3"
+
 def setup_gemini_pdf(api_key: str):
-    """Initialize Gemini client for PDF processing"""
-    return genai.Client(api_key=api_key)
-
-def pdf_file_to_base64(uploaded_pdf: Union[bytes, BinaryIO]) -> str:
-    """Convert uploaded PDF file or bytes to base64 string"""
-    if isinstance(uploaded_pdf, bytes):
-        return base64.b64encode(uploaded_pdf).decode("utf-8")
-    else:
-        content = uploaded_pdf.read()
-        uploaded_pdf.seek(0)  # Reset pointer for reuse
-        return base64.b64encode(content).decode("utf-8")
-
-def extract_vehicle_info_from_pdf(uploaded_pdf: Union[bytes, BinaryIO]) -> dict:
+    """Return the shared Gemini client for PDF processing"""
+    return get_pdf_client(api_key=api_key)
+
+def pdf_file_to_base64(uploaded_pdf: Union[bytes, BinaryIO, Document]) -> str:
+    """Convert uploaded PDF file or bytes to base64 string (cached on the document)"""
+    return Document.from_upload(uploaded_pdf).base64
+
+def extract_vehicle_info_from_pdf(uploaded_pdf: Union[bytes, BinaryIO, Document]) -> dict:
     """
     Extract vehicle information from uploaded PDF using Gemini and return structured dictionary
     """
     client = setup_gemini_pdf(os.getenv("GEMINI_API_KEY"))
-    model = "gemini-2.0-flash"
-    encoded_pdf = pdf_file_to_base64(uploaded_pdf)
+    model = MODEL_NAME
+    document = Document.from_upload(uploaded_pdf)
 
     contents = [
         types.Content(
             role="user",
             parts=[
+                # Raw bytes go straight to the request, no base64 round-trip
                 types.Part.from_bytes(
                     mime_type="application/pdf",
-                    data=base64.b64decode(encoded_pdf),
+                    data=document.content,
                 ),
                 types.Part.from_text(text=""),
             ],
@@ -81,31 +85,47 @@ def extract_vehicle_info_from_pdf(uploaded_pdf: Union[bytes, BinaryIO]) -> dict:
         ],
     )
 
-    try:
+    def stream_response(timeout):
+        # Each attempt gets its own request timeout (milliseconds) and restarts the stream
+        config = generate_content_config.model_copy(
+            update={"http_options": types.HttpOptions(timeout=int(timeout * 1000))}
+        )
         full_response = ""
+        usage = None
         for chunk in client.models.generate_content_stream(
             model=model,
             contents=contents,
-            config=generate_content_config,
+            config=config,
         ):
             full_response += chunk.text
+            usage = chunk.usage_metadata or usage
+        return full_response, usage
+
+    try:
+        full_response, usage = gemini_calls.call(stream_response)
 
-        # Extract JSON from response
-        json_start = full_response.find('{')
-        json_end = full_response.rfind('}') + 1
-        json_str = full_response[json_start:json_end]
-        return json.loads(json_str)
+        # The response is constrained to the schema, so it parses as-is
+        return parse_json_response("invoice", full_response, usage)
 
     except Exception as e:
         raise ValueError(f"Failed to parse Gemini response: {str(e)}")
 
-def process_gemini_vehicle_pdf(uploaded_pdf: Union[bytes, BinaryIO]) -> dict:
+def process_gemini_vehicle_pdf(uploaded_pdf: Union[bytes, BinaryIO, Document]) -> dict:
     """
     Main function to process uploaded PDF and return structured data
     """
     if uploaded_pdf:
-        # Extract structured information
-        vehicle_info = extract_vehicle_info_from_pdf(uploaded_pdf)
+        document = Document.from_upload(uploaded_pdf)
+
+        # Digital invoices are read from their text layer; the PDF only goes to
+        # Gemini when some field is not found there, to fill the missing ones
+        local_info, resolved = extract_text_fields(document.content, "invoice", "invoice")
+        if resolved:
+            vehicle_info = local_info
+        else:
+            started = time.perf_counter()
+            vehicle_info = merge_fields(local_info, extract_vehicle_info_from_pdf(document))
+            record_vision_fallback("invoice", time.perf_counter() - started)
 
         # Transform keys to presentation format (e.g., "engine_no" → "Engine No")
         transformed_dict = {
@@ -113,12 +133,14 @@ def process_gemini_vehicle_pdf(uploaded_pdf: Union[bytes, BinaryIO]) -> dict:
             for key, value in vehicle_info.items()
         }
 
-        # Convert uploaded PDF to base64 for frontend use
-        encoded_pdf = pdf_file_to_base64(uploaded_pdf)
-
         return {
-            "pdf_data": encoded_pdf,
             "extracted_info": transformed_dict
         }
 
     raise ValueError("No PDF file provided")
+
+async def process_gemini_vehicle_pdf_async(uploaded_pdf: Union[bytes, BinaryIO, Document]) -> dict:
+    """
+    Non-blocking variant of process_gemini_vehicle_pdf that runs on the model thread pool
+    """
+    return await run_blocking(process_gemini_vehicle_pdf, uploaded_pdf)
@@ -0,0 +1,80 @@
+import logging
+import os
+import threading
+from io import BytesIO
+import PIL.Image
+from PIL import ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Longest edge (pixels) sent to the vision model per document type. Override with
+# e.g. VISION_MAX_EDGE_CRBOOK=2400. Phone photos are often 4000px+ which only adds
+# upload time and tokens without improving extraction.
+DEFAULT_MAX_EDGE = {
+    "crbook": 2048,
+    "licence": 1600,
+    "passport": 1600,
+    "electricity": 2048,
+    "water": 2048,
+}
+IMAGE_FORMAT = os.getenv("VISION_IMAGE_FORMAT", "JPEG").upper()
+IMAGE_QUALITY = int(os.getenv("VISION_IMAGE_QUALITY", 85))
+
+_stats_lock = threading.Lock()
+preprocess_stats = {}
+
+
+def max_long_edge(doc_type: str) -> int:
+    """Return the configured maximum long edge for a document type"""
+    override = os.getenv(f"VISION_MAX_EDGE_{doc_type.upper()}")
+    if override:
+        return int(override)
+    return DEFAULT_MAX_EDGE.get(doc_type, 2048)
+
+
+def flatten_image(image):
+    """
+    Convert an image to RGB (or keep it grayscale), flattening transparent PNG/WebP
+    uploads onto white; a plain RGB convert drops the alpha band and leaves
+    transparent areas black
+    """
+    if image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        return PIL.Image.alpha_composite(PIL.Image.new("RGBA", image.size, (255, 255, 255, 255)), image).convert("RGB")
+    if image.mode not in ("RGB", "L"):
+        return image.convert("RGB")
+    return image
+
+
+def prepare_image(image, doc_type: str, original_size: int = None, max_edge: int = None) -> dict:
+    """
+    Normalise an image for the vision model: apply EXIF orientation, downscale to
+    the doc type's max long edge (or max_edge) and re-encode. Accepts raw bytes or
+    a PIL image and returns an inline blob ({"mime_type", "data"}) for generate_content.
+    """
+    if isinstance(image, (bytes, bytearray)):
+        original_size = len(image)
+        image = PIL.Image.open(BytesIO(image))
+    elif original_size is None:
+        original_size = image.width * image.height * len(image.getbands())
+
+    limit = max_edge or max_long_edge(doc_type)
+    # Let the JPEG decoder downscale while decoding instead of after
+    image.draft("RGB", (limit, limit))
+    image = ImageOps.exif_transpose(image)
+    image = flatten_image(image)
+    if max(image.size) > limit:
+        image.thumbnail((limit, limit), PIL.Image.LANCZOS)
+
+    buffer = BytesIO()
+    image.save(buffer, format=IMAGE_FORMAT, quality=IMAGE_QUALITY)
+    data = buffer.getvalue()
+
+    with _stats_lock:
+        stats = preprocess_stats.setdefault(doc_type, {"images": 0, "original_bytes": 0, "sent_bytes": 0})
+        stats["images"] += 1
+        stats["original_bytes"] += original_size
+        stats["sent_bytes"] += len(data)
+    logger.info(f"Prepared {doc_type} image {image.width}x{image.height}: {original_size} -> {len(data)} bytes")
+
+    return {"mime_type": PIL.Image.MIME[IMAGE_FORMAT], "data": data}
@@ -0,0 +1,136 @@
+import datetime
+import hashlib
+import logging
+import os
+import threading
+import time
+import google.generativeai as genai
+from app.gemini.client import configure
+
+try:
+    from google.generativeai import caching
+except ImportError:  # SDK without context caching, instructions are sent uncached
+    caching = None
+
+logger = logging.getLogger(__name__)
+
+# Static extraction instructions are sent as a system instruction. Where the API
+# accepts it (the model supports caching and the instruction meets the minimum
+# cacheable size) it is stored once as cached content and referenced by each
+# request, so its tokens are billed at the cached rate.
+PROMPT_CACHE = os.getenv("PROMPT_CACHE", "true").lower() in ("1", "true", "yes")
+PROMPT_CACHE_TTL = int(os.getenv("PROMPT_CACHE_TTL", 3600))
+# The API rejects cached content below a minimum token count; shorter instructions
+# are not offered for caching at all. Tokens are estimated at 4 characters each.
+PROMPT_CACHE_MIN_TOKENS = int(os.getenv("PROMPT_CACHE_MIN_TOKENS", 4096))
+CHARACTERS_PER_TOKEN = 4
+# Extend a cache that is used when it has less than this many seconds left
+REFRESH_MARGIN = 300
+
+_stats_lock = threading.Lock()
+prompt_cache_stats = {"cached": 0, "refreshed": 0, "fallbacks": 0, "too_short": 0, "deleted": 0}
+
+
+def _count(key):
+    with _stats_lock:
+        prompt_cache_stats[key] += 1
+
+
+class PromptCache:
+    """
+    Models bound to a static system instruction, one per model and instruction.
+    Cached content is extended while it is in use and recreated if it has
+    expired; when caching is unavailable the instruction is attached to a plain
+    model, so the prompt is still only built once. Creation is retried after the
+    TTL, except for instructions too short to cache, which are never offered.
+    Calls to the API only hold the lock of the instruction they are for.
+    """
+
+    def __init__(self, ttl=PROMPT_CACHE_TTL, enabled=PROMPT_CACHE, min_tokens=PROMPT_CACHE_MIN_TOKENS):
+        self.ttl = ttl
+        self.enabled = enabled
+        self.min_tokens = min_tokens
+        self._entries = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def model(self, model_name: str, instruction: str, api_key: str = None) -> genai.GenerativeModel:
+        """Return a model that carries the instruction, from cached content when possible"""
+        configure(api_key)
+        key = (model_name, hashlib.sha256(instruction.encode("utf-8")).hexdigest())
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            entry = self._entries.get(key)
+            now = time.time()
+            if entry is not None and entry["cached"] is not None and entry["expires"] - now < REFRESH_MARGIN:
+                entry = self._refresh(key, entry, now)
+            elif entry is not None and entry["cached"] is None and entry["expires"] <= now and self.enabled:
+                entry = None
+            if entry is None:
+                entry = self._create(model_name, instruction, now)
+                with self._lock:
+                    self._entries[key] = entry
+            return entry["model"]
+
+    def _create(self, model_name, instruction, now):
+        if self.enabled and caching is not None and len(instruction) / CHARACTERS_PER_TOKEN < self.min_tokens:
+            # Below the API minimum; creating it would only fail, so never try again
+            _count("too_short")
+            logger.info(f"Not caching {model_name} system instruction: about {len(instruction) // CHARACTERS_PER_TOKEN} tokens, below {self.min_tokens}")
+            return {
+                "model": genai.GenerativeModel(model_name, system_instruction=instruction),
+                "cached": None,
+                "expires": float("inf"),
+            }
+        if self.enabled and caching is not None:
+            try:
+                cached = caching.CachedContent.create(
+                    model=model_name if model_name.startswith("models/") else f"models/{model_name}",
+                    system_instruction=instruction,
+                    ttl=datetime.timedelta(seconds=self.ttl)
+                )
+                _count("cached")
+                logger.info(f"Cached {model_name} system instruction as {cached.name} for {self.ttl}s")
+                return {
+                    "model": genai.GenerativeModel.from_cached_content(cached_content=cached),
+                    "cached": cached,
+                    "expires": now + self.ttl,
+                }
+            except Exception as e:
+                # Too short to cache, unsupported model version, quota... send it uncached
+                _count("fallbacks")
+                logger.info(f"Not caching {model_name} system instruction: {str(e)}")
+        return {
+            "model": genai.GenerativeModel(model_name, system_instruction=instruction),
+            "cached": None,
+            "expires": now + self.ttl,
+        }
+
+    def _refresh(self, key, entry, now):
+        try:
+            entry["cached"].update(ttl=datetime.timedelta(seconds=self.ttl))
+            entry["expires"] = now + self.ttl
+            _count("refreshed")
+            return entry
+        except Exception as e:
+            logger.warning(f"Could not extend cached content {entry['cached'].name}: {str(e)}")
+            with self._lock:
+                del self._entries[key]
+            return None
+
+    def close(self):
+        """Delete the cached contents created by this process"""
+        with self._lock:
+            for entry in self._entries.values():
+                if entry["cached"] is None:
+                    continue
+                try:
+                    entry["cached"].delete()
+                    _count("deleted")
+                except Exception as e:
+                    logger.warning(f"Failed to delete cached content {entry['cached'].name}: {str(e)}")
+            self._entries.clear()
+
+
+prompt_cache = PromptCache()
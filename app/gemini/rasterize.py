@@ -0,0 +1,46 @@
+import logging
+import os
+import fitz  # PyMuPDF
+import PIL.Image
+from app.gemini.preprocess import max_long_edge
+
+logger = logging.getLogger(__name__)
+
+# Render resolution bounds. Within them the DPI is chosen so the page comes out at
+# the vision model's long edge, and raised for pages dense with small text. The
+# rendered size is what the model receives, so these bounds also cap what is sent.
+PDF_MIN_DPI = int(os.getenv("PDF_MIN_DPI", 100))
+PDF_MAX_DPI = int(os.getenv("PDF_MAX_DPI", 300))
+# Characters per square inch above which a page counts as dense (small print tables)
+DENSE_TEXT_PER_SQ_INCH = 60
+DENSE_TEXT_SCALE = 1.5
+
+
+def page_dpi(page, doc_type: str) -> int:
+    """Pick the render DPI for a page from its size and text density"""
+    width, height = page.rect.width / 72, page.rect.height / 72
+    dpi = max_long_edge(doc_type) / max(width, height, 1 / 72)
+    # Scanned pages have no text layer, so only born-digital dense pages are boosted
+    characters = len(page.get_text("text").strip())
+    if characters / (width * height) > DENSE_TEXT_PER_SQ_INCH:
+        dpi *= DENSE_TEXT_SCALE
+    return int(min(max(dpi, PDF_MIN_DPI), PDF_MAX_DPI))
+
+
+def iter_pdf_pages(content: bytes, doc_type: str, max_pages: int = None):
+    """
+    Render a PDF's pages one at a time, yielding (page number, PIL image). Each
+    image is a view over the page's pixmap, which is released when the next page
+    is rendered, so only one page is in memory at a time; consume (or copy) the
+    image before advancing the generator.
+    """
+    with fitz.open(stream=content, filetype="pdf") as doc:
+        pages = doc.page_count if max_pages is None else min(doc.page_count, max_pages)
+        for number in range(pages):
+            page = doc.load_page(number)
+            dpi = page_dpi(page, doc_type)
+            pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csRGB, alpha=False)
+            logger.info(f"Rendered {doc_type} page {number + 1}/{doc.page_count} at {dpi} DPI ({pix.width}x{pix.height})")
+            # Wrap the pixmap samples without copying them (rows may be padded to the stride)
+            yield number, PIL.Image.frombuffer("RGB", (pix.width, pix.height), pix.samples_mv, "raw", "RGB", pix.stride, 1)
+            del pix
@@ -0,0 +1,91 @@
+import functools
+import hashlib
+import importlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Extractor per document type: (module, coroutine function, extra keyword arguments).
+# Modules are only imported when a document type is first used, so the web tier
+# does not load every SDK and model definition at startup.
+EXTRACTORS = {
+    "crbook": ("app.gemini.crbook", "process_gemini_cr_book_async", {}),
+    "licence": ("app.gemini.drlicence", "process_gemini_licence_async", {}),
+    "passport": ("app.gemini.passport", "process_gemini_passport_async", {}),
+    "electricity": ("app.gemini.utility_bills", "process_utility_bill_async", {"bill_type": "electricity"}),
+    "water": ("app.gemini.utility_bills", "process_utility_bill_async", {"bill_type": "water"}),
+    "invoice": ("app.gemini.invoice", "process_gemini_vehicle_pdf_async", {}),
+}
+
+# Comma separated document types to import at startup ("all" for every type)
+EXTRACTOR_PREWARM = os.getenv("EXTRACTOR_PREWARM", "")
+
+_lock = threading.Lock()
+_loaded = {}
+
+
+def load(doc_type: str):
+    """Return (extractor, module) for a document type, importing the module on first use"""
+    loaded = _loaded.get(doc_type)
+    if loaded is not None:
+        return loaded
+    if doc_type not in EXTRACTORS:
+        raise ValueError(f"Unknown document type {doc_type}")
+    module_name, func_name, kwargs = EXTRACTORS[doc_type]
+    with _lock:
+        if doc_type not in _loaded:
+            started = time.perf_counter()
+            module = importlib.import_module(module_name)
+            extractor = getattr(module, func_name)
+            if kwargs:
+                extractor = functools.partial(extractor, **kwargs)
+            _loaded[doc_type] = (extractor, module)
+            logger.info(f"Loaded {doc_type} extractor from {module_name} in {time.perf_counter() - started:.2f}s")
+        return _loaded[doc_type]
+
+
+@functools.lru_cache(maxsize=None)
+def settings_hash(doc_type: str) -> str:
+    """
+    Short hash of the preprocessing settings that change what the model is sent
+    (image encoding and size, PDF render resolution and page limit, text layer use)
+    """
+    from app.gemini import preprocess, rasterize, text_layer
+    _, module = load(doc_type)
+    settings = {
+        "image_format": preprocess.IMAGE_FORMAT,
+        "image_quality": preprocess.IMAGE_QUALITY,
+        "max_edge": preprocess.max_long_edge(doc_type),
+        "pdf_dpi": [rasterize.PDF_MIN_DPI, rasterize.PDF_MAX_DPI],
+        "pdf_text_fast_path": text_layer.PDF_TEXT_FAST_PATH,
+        "max_pages": getattr(module, "UTILITY_BILL_MAX_PAGES", None),
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:8]
+
+
+def version(doc_type: str) -> str:
+    """Model, prompt and preprocessing settings version of a document type's extractor, used in cache keys"""
+    _, module = load(doc_type)
+    return f"{module.MODEL_NAME}:{module.PROMPT_VERSION}:{settings_hash(doc_type)}"
+
+
+def prewarm(doc_types=None) -> list:
+    """
+    Import the given document types (default EXTRACTOR_PREWARM) and build the
+    prompt-cache models their extractors use, returning the document types
+    """
+    if doc_types is None:
+        doc_types = [name.strip() for name in EXTRACTOR_PREWARM.split(",") if name.strip()]
+    if "all" in doc_types:
+        doc_types = list(EXTRACTORS)
+    for doc_type in doc_types:
+        _, module = load(doc_type)
+        # The PDF extractor uses the shared client instead of a cached-prompt model
+        setup = getattr(module, "setup_gemini", None)
+        if setup is not None:
+            setup(os.getenv("GEMINI_API_KEY"), **EXTRACTORS[doc_type][2])
+    return doc_types
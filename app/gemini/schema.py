@@ -0,0 +1,106 @@
+import copy
+import json
+import logging
+import threading
+from functools import lru_cache
+from google.generativeai import GenerationConfig
+
+logger = logging.getLogger(__name__)
+
+# Keys Gemini's OpenAPI schema subset understands; titles, defaults etc. are dropped
+SCHEMA_KEYS = ("description", "enum", "required")
+
+_stats_lock = threading.Lock()
+response_stats = {}
+
+
+@lru_cache(maxsize=None)
+def response_schema(model) -> dict:
+    """
+    Derive a Gemini response schema from a Pydantic model. Optional fields become
+    nullable, nested models are inlined and dates are requested as YYYY-MM-DD strings.
+    """
+    if hasattr(model, "model_json_schema"):
+        schema = model.model_json_schema()
+    else:
+        schema = model.schema()
+    definitions = {**schema.get("$defs", {}), **schema.get("definitions", {})}
+    return _convert(schema, definitions)
+
+
+def _convert(node: dict, definitions: dict) -> dict:
+    node = _resolve(node, definitions)
+    if "allOf" in node and len(node["allOf"]) == 1:
+        return _convert({**_resolve(node["allOf"][0], definitions), **_copy_keys(node)}, definitions)
+
+    variants = node.get("anyOf") or node.get("oneOf")
+    if variants:
+        options = [option for option in variants if option.get("type") != "null"]
+        # Field level keys (description) override the ones on the chosen variant
+        converted = _convert({**_resolve(options[0], definitions), **_copy_keys(node)}, definitions)
+        if len(options) < len(variants):
+            converted["nullable"] = True
+        return converted
+
+    converted = _copy_keys(node)
+    node_type = node.get("type", "string")
+    converted["type"] = node_type.upper()
+    if node.get("format") == "date" and "YYYY-MM-DD" not in node.get("description", ""):
+        converted["description"] = f"{node.get('description', 'Date')} (YYYY-MM-DD)"
+    if node_type == "array":
+        converted["items"] = _convert(node.get("items", {}), definitions)
+    if node_type == "object":
+        converted["properties"] = {
+            name: _convert(prop, definitions) for name, prop in node.get("properties", {}).items()
+        }
+    return converted
+
+
+def _resolve(node: dict, definitions: dict) -> dict:
+    if "$ref" in node:
+        return _resolve(definitions[node["$ref"].rsplit("/", 1)[-1]], definitions)
+    return node
+
+
+def _copy_keys(node: dict) -> dict:
+    return {key: node[key] for key in SCHEMA_KEYS if key in node}
+
+
+def json_config(model, **kwargs) -> GenerationConfig:
+    """Generation config constraining the output to the model's JSON schema"""
+    return GenerationConfig(
+        response_mime_type="application/json",
+        response_schema=copy.deepcopy(response_schema(model)),
+        **kwargs
+    )
+
+
+def parse_json_response(doc_type: str, text: str, usage=None, expected=dict):
+    """
+    Parse a constrained JSON response (an object, or a list for batched calls)
+    and record parse failures and token counts per document type (served at /stats).
+    Cached prompt tokens are the part of the prompt served from cached content.
+    """
+    output_tokens = getattr(usage, "candidates_token_count", None) or 0
+    prompt_tokens = getattr(usage, "prompt_token_count", None) or 0
+    cached_tokens = getattr(usage, "cached_content_token_count", None) or 0
+    try:
+        data = json.loads(text)
+        failed = not isinstance(data, expected)
+    except json.JSONDecodeError:
+        failed = True
+
+    with _stats_lock:
+        stats = response_stats.setdefault(doc_type, {
+            "responses": 0, "parse_failures": 0, "output_tokens": 0, "prompt_tokens": 0, "cached_prompt_tokens": 0
+        })
+        stats["responses"] += 1
+        stats["parse_failures"] += failed
+        stats["output_tokens"] += output_tokens
+        stats["prompt_tokens"] += prompt_tokens
+        stats["cached_prompt_tokens"] += cached_tokens
+
+    if failed:
+        logger.warning(f"Unparseable {doc_type} response: {text[:200]}")
+        raise ValueError(f"Failed to parse Gemini response: {text}")
+    return data
@@ -0,0 +1,130 @@
+import logging
+import os
+import re
+import threading
+import time
+import fitz  # PyMuPDF
+from app.ocr.rules import Rule, RuleSet
+
+logger = logging.getLogger(__name__)
+
+# Digitally generated PDFs carry a text layer; when the rules below fill every
+# field from it, the vision model is not called at all
+PDF_TEXT_FAST_PATH = os.getenv("PDF_TEXT_FAST_PATH", "true").lower() in ("1", "true", "yes")
+TEXT_LAYER_MAX_PAGES = 5
+# Fewer characters than this means a scanned PDF (no usable text layer)
+MIN_TEXT_CHARACTERS = 40
+
+_stats_lock = threading.Lock()
+text_layer_stats = {}
+
+AMOUNT = r"(?:Rs\.?|LKR)?\s*([+-]?\d[\d,]*\.\d{2})\b"
+ASTERISKS = re.compile(r"\*+")
+SPACES = re.compile(r"\s+")
+
+
+def value_after_label(match, lines, i):
+    # Tables often put the value on the line below its label
+    value = match.group(1).strip()
+    if not value and i is not None and i + 1 < len(lines):
+        value = lines[i + 1].strip()
+    return value or None
+
+def identifier(match, lines, i):
+    # Engine and chassis numbers mix letters and digits, labels like "Chassis No: Model" are not values
+    value = match.group(1).upper()
+    if re.search(r"\d", value) and re.search(r"[A-Z]", value):
+        return value
+    return None
+
+def invoice_number(match, lines, i):
+    # Invoice numbers are often all digits, but a bare word ("Invoice No: Date") is a label
+    value = match.group(1).upper()
+    return value if re.search(r"\d", value) else None
+
+def registration_number(match, lines, i):
+    letters, digits = match.group(1), match.group(2)
+    return f"{SPACES.sub(' ', letters.strip())}-{digits}"
+
+def amount(match, lines, i):
+    value = match.group(1).replace(",", "")
+    return f"{float(value):+.2f}" if value[0] in "+-" else f"{float(value):.2f}"
+
+def address(match, lines, i):
+    value = value_after_label(match, lines, i)
+    return SPACES.sub(" ", ASTERISKS.sub("", value)).strip() if value else None
+
+
+# Field rules per document type, covering every field of its response schema
+TEXT_RULES = {
+    "invoice": RuleSet("invoice_text", [
+        Rule("engine_no", "Engine No", r"\b(?i:engine\s*(?:no|number)\.?)\s*[:\-]?\s*([A-Z0-9][A-Z0-9\-]{3,19})\b", identifier, first_only=True),
+        Rule("chassis_no", "Chassis No", r"\b(?i:(?:chassis|vin)\s*(?:no|number)?\.?)\s*[:\-]?\s*([A-Z0-9][A-Z0-9\-]{5,19})\b", identifier, first_only=True),
+        Rule("registration_no", "Registration No", r"\b(?i:(?:vehicle\s+)?reg(?:istration)?\.?\s*(?:no|number)\.?|vehicle\s*(?:no|number)\.?)\s*[:\-]?\s*((?:[A-Z]{2}\s)?[A-Z]{2,3})\s?-\s?(\d{4})\b", registration_number, first_only=True),
+        Rule("invoice_no", "Invoice No", r"\b(?i:invoice\s*(?:no|number|#)\.?)\s*[:\-]?\s*([A-Z0-9][A-Z0-9/\-]*)", invoice_number, first_only=True),
+        Rule("year", "Year", r"\b(?i:year(?:\s+of\s+(?:manufacture|make))?|yom)\s*[:\-]?\s*((?:19|20)\d{2})\b", value_after_label, first_only=True),
+    ]),
+    "utility_bill": RuleSet("utility_bill_text", [
+        Rule("name", "Name", r"^\s*(?i:(?:account\s+|customer\s+)?name)\s*[:\-]\s*(.*)$", value_after_label, first_only=True),
+        Rule("address", "Address", r"^\s*(?i:(?:service\s+|supply\s+|premises\s+)?address)\s*[:\-]\s*(.*)$", address, first_only=True),
+        Rule("current_charge", "Current Charge", r"\b(?i:current\s+(?:month(?:'s)?\s+)?charges?|charges?\s+for\s+the\s+month)\s*[:\-]?\s*" + AMOUNT, amount, first_only=True),
+        Rule("outstanding_due", "Outstanding due", r"\b(?i:outstanding(?:\s+amount)?|arrears|balance\s+b/?f)\s*[:\-]?\s*" + AMOUNT, amount, first_only=True),
+        Rule("total_due", "Total Due", r"\b(?i:total\s+(?:amount\s+)?(?:due|payable))\s*[:\-]?\s*" + AMOUNT, amount, first_only=True),
+    ]),
+}
+
+
+def pdf_text(content: bytes, max_pages: int = TEXT_LAYER_MAX_PAGES) -> str:
+    """Return the embedded text of a PDF's first pages in reading order"""
+    with fitz.open(stream=content, filetype="pdf") as doc:
+        pages = min(doc.page_count, max_pages)
+        return "\n".join(doc.load_page(number).get_text("text", sort=True) for number in range(pages))
+
+
+def extract_text_fields(content: bytes, rules: str, doc_type: str):
+    """
+    Run the deterministic rules for a PDF over its text layer. Returns the fields
+    found (None where a rule did not match) and whether all of them were found,
+    so the vision model can be skipped.
+    """
+    if not PDF_TEXT_FAST_PATH:
+        return {}, False
+    started = time.perf_counter()
+    rule_set = TEXT_RULES[rules]
+    try:
+        text = pdf_text(content)
+    except Exception as e:
+        logger.warning(f"Could not read the {doc_type} PDF text layer: {str(e)}")
+        text = ""
+    has_text = len(text.strip()) >= MIN_TEXT_CHARACTERS
+    fields = rule_set.apply(text) if has_text else {}
+    resolved = has_text and all(fields.get(field) for field in rule_set.fields)
+    elapsed = time.perf_counter() - started
+
+    with _stats_lock:
+        stats = text_layer_stats.setdefault(doc_type, {
+            "pdfs": 0, "with_text": 0, "resolved_locally": 0, "local_seconds": 0.0,
+            "vision_fallbacks": 0, "vision_seconds": 0.0,
+        })
+        stats["pdfs"] += 1
+        stats["with_text"] += has_text
+        stats["resolved_locally"] += resolved
+        stats["local_seconds"] += elapsed
+    logger.info(f"{doc_type} PDF text layer: {len(text)} characters, resolved locally: {resolved} ({elapsed:.3f}s)")
+    return fields, resolved
+
+
+def record_vision_fallback(doc_type: str, seconds: float):
+    """Count a vision model call made because the text layer was not enough"""
+    with _stats_lock:
+        stats = text_layer_stats.get(doc_type)
+        if stats is not None:
+            stats["vision_fallbacks"] += 1
+            stats["vision_seconds"] += seconds
+
+
+def merge_fields(local: dict, vision: dict) -> dict:
+    """Combine vision results with the fields the text layer filled, which take precedence"""
+    merged = dict(vision)
+    merged.update({field: value for field, value in local.items() if value})
+    return merged
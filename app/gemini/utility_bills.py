@@ -1,107 +1,102 @@
-import google.generativeai as genai
-import base64
-import json
-from io import BytesIO
-import PIL.Image
+from contextlib import closing
 from dotenv import load_dotenv
 import os
-import fitz  # PyMuPDF
+import time
+from app.services.executor import run_blocking
+from app.gemini.prompt_cache import prompt_cache
+from app.gemini.preprocess import prepare_image
+from app.gemini.rasterize import iter_pdf_pages
+from app.gemini.batching import generate_json
+from app.gemini.text_layer import extract_text_fields, merge_fields, record_vision_fallback
+from app.models.document import Document
+from app.models.utility_bill import UtilityBillInfo
 
 load_dotenv()
 
-def setup_gemini(api_key: str):
-    """Initialize Gemini with API key"""
-    genai.configure(api_key=api_key)
-    return genai.GenerativeModel('gemini-2.0-flash')
+MODEL_NAME = 'gemini-2.0-flash'
+# Bump whenever the prompt or schema changes so cached results are not reused
+PROMPT_VERSION = "5"
+
+# PDF pages are sent one at a time until these fields have all been found
+REQUIRED_FIELDS = ("Name", "Address", "Total Due")
+UTILITY_BILL_MAX_PAGES = int(os.getenv("UTILITY_BILL_MAX_PAGES", 5))
+
+# System instruction per bill type; field names and formats come from the UtilityBillInfo response schema
+UTILITY_BILL_PROMPT = """
+        Analyze this {bill_type} bill document image.
+
+        Rules:
+1. Extract information directly from the document image
+2. Convert amounts to numbers without currency symbols and two decimal point
+3. If field not found, set to null
+4. Handle both Sinhala/English text
+5. Address should only contain text and numbers(house numbers like 25/1 or 26,)
+6. Names and addresses should be exact matches from the document
+        """
+
+def setup_gemini(api_key: str, bill_type: str):
+    """Return the shared Gemini model carrying the bill type's instructions (cached content where possible)"""
+    return prompt_cache.model(MODEL_NAME, UTILITY_BILL_PROMPT.format(bill_type=bill_type), api_key=api_key)
+
+def extract_bill_info(model, image, bill_type) -> dict:
+    """Extract the bill fields from one prepared image"""
+    bill_data = generate_json(bill_type, model, None, image, UtilityBillInfo)
+
+    return {
+        "Name": bill_data.get("name"),
+        "Address": bill_data.get("address"),
+        "Current Charge": bill_data.get("current_charge"),
+        "Outstanding due": bill_data.get("outstanding_due"),
+        # "Previous Due": bill_data.get("previous_due"),
+        "Total Due": bill_data.get("total_due")
+    }
 
 def process_utility_bill(uploaded_file, bill_type):
     """Process utility bills (electricity/water) handling both images and PDFs"""
-    model = setup_gemini(os.getenv("GEMINI_API_KEY"))
+    model = setup_gemini(os.getenv("GEMINI_API_KEY"), bill_type)
     
     try:
-        # Read file content and detect PDF
-        if isinstance(uploaded_file, bytes):
-            file_content = uploaded_file
-        else:
-            file_content = uploaded_file.read()
-            uploaded_file.seek(0)
-        
-        is_pdf = file_content.startswith(b'%PDF-')
+        # Wrap the upload once; the PDF check comes from the document
+        document = Document.from_upload(uploaded_file)
         
         result = {
-            "image_data": None,
             "extracted_info": None
         }
 
-        if is_pdf:
-            # PDF processing with PyMuPDF
-            with fitz.open(stream=file_content, filetype="pdf") as doc:
-                # Get first page as high-quality image
-                first_page = doc.load_page(0)
-                pix = first_page.get_pixmap(matrix=fitz.Matrix(300/72, 300/72))  # 300 DPI
-                preview_image = PIL.Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-
-            # Prepare base64 PDF data
-            result["image_data"] = base64.b64encode(file_content).decode()
-            
-            # Gemini processing with image only
-            prompt = f"""
-            Analyze this {bill_type} bill document image and return JSON with:
-            {{
-                "name": "Account holder's name",
-                "address": "Service address without asterik",
-                "current_charge": "Current month charges (number only)",
-                "previous_due": "Previous balance/arrears (number only)",
-                "outstanding_due": "Outstanding Amount (number only) / Dues Previous month (with +/- sign)",
-                "total_due": "Total amount due (number only)",
-            }}
+        if document.is_pdf:
+            # Digitally generated bills are read from their text layer first; the
+            # pages are only sent to Gemini when some field was not found there
+            local_info, resolved = extract_text_fields(document.content, "utility_bill", bill_type)
+            if resolved:
+                result["extracted_info"] = local_info
+                return result
 
-            Rules:
-1. Extract information directly from the document image
-2. Convert amounts to numbers without currency symbols and two decimal point
-3. If field not found, set to null
-4. Handle both Sinhala/English text
-5. Address should only contain text and numbers(house numbers like 25/1 or 26,)
-6. Names and addresses should be exact matches from the document
-            """
-            response = model.generate_content([prompt, preview_image])
+            # Render and extract page by page, keeping the first value found for
+            # each field, and stop once the required fields are all present
+            started = time.perf_counter()
+            extracted_info = {}
+            with closing(iter_pdf_pages(document.content, bill_type, UTILITY_BILL_MAX_PAGES)) as pages:
+                for number, page_image in pages:
+                    # The render DPI already sized the page (boosted for small print), keep it
+                    image = prepare_image(page_image, bill_type, max_edge=max(page_image.size))
+                    page_info = extract_bill_info(model, image, bill_type)
+                    for field, value in merge_fields(local_info, page_info).items():
+                        if extracted_info.get(field) is None:
+                            extracted_info[field] = value
+                    if all(extracted_info.get(field) for field in REQUIRED_FIELDS):
+                        break
+            record_vision_fallback(bill_type, time.perf_counter() - started)
+            result["extracted_info"] = extracted_info
         else:
             # Direct image processing
-            image = PIL.Image.open(BytesIO(file_content))
-            result["image_data"] = base64.b64encode(file_content).decode()
-            
-            prompt = f"""
-            Analyze this {bill_type} bill and return JSON with:
-            {{
-                "name": "Account holder's name",
-                "address": "Service address",
-                "current_charge": "Current month charges",
-                "previous_due": "Previous balance/arrears",
-                "outstanding_due": "Outstanding Amount",
-                "total_due": "Total amount due",
-            }}
-            Rules same as PDF version
-            """
-            response = model.generate_content([prompt, image])
-
-        # Process response
-        response_text = response.text
-        json_str = response_text[response_text.find('{'):response_text.rfind('}')+1]
-        bill_data = json.loads(json_str)
-
-        result["extracted_info"] = {
-            "Name": bill_data.get("name"),
-            "Address": bill_data.get("address"),
-            "Current Charge": bill_data.get("current_charge"),
-            "Outstanding due": bill_data.get("outstanding_due"),
-            # "Previous Due": bill_data.get("previous_due"),
-            "Total Due": bill_data.get("total_due")
-        }
+            image = prepare_image(document.content, bill_type)
+            result["extracted_info"] = extract_bill_info(model, image, bill_type)
 
         return result
 
     except Exception as e:
-        error_msg = f"Processing error: {str(e)}"
-        if 'response_text' in locals():
-            error_msg += f"\nResponse: {response_text}"
-        raise ValueError(error_msg)
+        raise ValueError(f"Processing error: {str(e)}")
+
+async def process_utility_bill_async(uploaded_file, bill_type):
+    """Non-blocking variant of process_utility_bill that runs on the model thread pool"""
+    return await run_blocking(process_utility_bill, uploaded_file, bill_type)
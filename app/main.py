@@ -1,18 +1,31 @@
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-import base64
+import asyncio
+import json
 import logging
+import uuid
 from fasthtml.common import *
 from shad4fast import *
 from fastapi import File, UploadFile
-from starlette.responses import FileResponse
+from starlette.responses import FileResponse, StreamingResponse
 from starlette.datastructures import UploadFile
-from app.gemini.crbook import process_gemini_cr_book
-from app.gemini.drlicence import process_gemini_licence
-from app.gemini.passport import process_gemini_passport
-from app.gemini.utility_bills import process_utility_bill
-from app.gemini.invoice import process_gemini_vehicle_pdf
+from app.gemini import client as gemini_client
+from app.gemini import registry as extractors
+from app.gemini.preprocess import preprocess_stats
+from app.gemini.batching import batch_stats
+from app.gemini.prompt_cache import prompt_cache, prompt_cache_stats
+from app.gemini.schema import response_stats
+from app.gemini.text_layer import text_layer_stats
+from app.models.document import Document
+from app.ocr.workers import PROCESSORS as local_ocr_doc_types, OCRService
+from app.services.cache import result_cache
+from app.services.executor import run_blocking, shutdown_pool
+from app.services.resilience import gemini_calls, openai_calls
+from app.services.previews import make_thumbnail, not_modified, preview_response
+from app.services.jobs import DONE, FAILED, create_job_queue
+from app.services.batch import BATCH_CONCURRENCY, read_batch_documents, run_batch
+from app.services.uploads import UploadTooLarge, create_upload_store
 
 # Set up logging
 logging.basicConfig(
@@ -24,6 +37,8 @@ logger = logging.getLogger(__name__)
 # Initialize the app    
 app, rt = fast_app(
     pico=False,
+    # Share the secret across workers so any of them can read the session cookie
+    secret_key=os.getenv("SESSION_SECRET"),
     hdrs=(
         ShadHead(tw_cdn=True, theme_handle=False),
         Style("""
@@ -148,6 +163,7 @@ app, rt = fast_app(
             .loading-btn { display: none; }
             .processing-btn { display: flex; }
         """),
+        Script(src="https://unpkg.com/htmx-ext-sse@2.2.2/sse.js"),
         Script("""
             document.documentElement.setAttribute('class', 'dark');       
             function copyToClipboard(text, tooltipId) {
@@ -165,15 +181,57 @@ app, rt = fast_app(
     )
 )
 
-# In-memory storage
-uploaded_images = {
-    "crbook": None,
-    "licence": None,
-    "passport": None,
-    "electricity": None,
-    "water": None,
-    "invoice": None
-}
+# Uploads keyed by session and doc type (memory, spool or redis backend)
+upload_store = create_upload_store()
+
+def upload_key(session, doc_type):
+    """Return the upload store key for this browser session and document type"""
+    if "upload_id" not in session:
+        session["upload_id"] = uuid.uuid4().hex
+    return f"{session['upload_id']}:{doc_type}"
+
+def job_upload_key(session, doc_type, version):
+    """Return the key a background job's document is kept under, so a newer upload does not replace its preview"""
+    return upload_key(session, f"{doc_type}:{version}")
+
+def load_upload(session, doc_type, version=None):
+    """Return the stored upload, or the job copy of an earlier upload when `version` names one"""
+    if version:
+        content = upload_store.get(job_upload_key(session, doc_type, version))
+        if content:
+            return content
+    return upload_store.get(upload_key(session, doc_type))
+
+async def run_extractor(doc_type, content):
+    """Run the Gemini extractor for a document type through the result cache without blocking the event loop"""
+    # The extractor module is imported on first use, off the event loop
+    extractor, _ = await run_blocking(extractors.load, doc_type)
+    version = extractors.version(doc_type)
+    document = Document.from_upload(content)
+    return await result_cache.get_or_compute_async(document, doc_type, version, extractor)
+
+# Long running extractions (multi-page PDFs) run as background jobs
+job_doc_types = ("electricity", "water", "invoice")
+job_queue = create_job_queue(run_extractor)
+
+# Local PaddleOCR pipelines (?ocr=local), run on worker processes or the model thread pool
+ocr_service = OCRService()
+
+def validate_extracted_info(doc_type, extracted_info):
+    """Replace the extracted information with an error when required fields are missing"""
+    if doc_type == "licence" and ("Licence Number" not in extracted_info or extracted_info["Licence Number"] == None or extracted_info["Nic Number"] == None):
+        return { "Error": "Upload valid Driving Licence image" }
+    elif doc_type in ["electricity", "water"]:
+        required_fields = ["Name", "Address", "Total Due"]
+        if not all(extracted_info.get(field) for field in required_fields):
+            return {"Error": f"Invalid {doc_type.replace('_', ' ')} image"}
+    elif doc_type == "passport" and ("Passport Number" not in extracted_info or extracted_info["Passport Number"] == None or extracted_info["Nic Number"] == None):
+        return { "Error": "Upload valid Passport image" }
+    elif doc_type == "crbook" and ("Registration Number" not in extracted_info or extracted_info["Registration Number"] == None):
+        return { "Error": "Upload valid CR book image" }
+    elif doc_type == "invoice" and ("Chassis No" not in extracted_info or extracted_info["Chassis No"] is None):
+        return { "Error": "Upload valid Invoice PDF" }
+    return extracted_info
 
 
 # Add application lifecycle handlers
@@ -181,13 +239,31 @@ uploaded_images = {
 async def startup_event():
     """Handle application startup"""
     logger.info("Starting Document Information Extractor application...")
+    gemini_client.startup()
+    # Extractors and their models load on first use unless pre-warmed with EXTRACTOR_PREWARM
+    doc_types = await run_blocking(extractors.prewarm)
+    if doc_types:
+        logger.info(f"Pre-warmed extractors: {', '.join(doc_types)}")
+    ocr_service.start()
+    # Process workers load their own engine; only the in-process engine needs warming here
+    if ocr_service.backend == "thread" and os.getenv("OCR_WARMUP", "false").lower() in ("1", "true", "yes"):
+        # PaddleOCR is an optional dependency, only loaded when the local OCR pipeline is used
+        from app.ocr.engine import warm_up
+        await run_blocking(warm_up)
+    await job_queue.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Handle application shutdown"""
     logger.info("Shutting down Document Information Extractor application...")
-    # Clear any uploaded images
-    uploaded_images.clear()
+    # Release the upload store (memory uploads are dropped)
+    upload_store.close()
+    await job_queue.stop()
+    ocr_service.stop()
+    shutdown_pool()
+    prompt_cache.close()
+    gemini_client.shutdown()
+    result_cache.close()
 
 # Add global error handling
 @app.exception_handler(Exception)
@@ -305,8 +381,12 @@ def get_upload_card(doc_type):
         standard=True
     )
     
-def get_document_display(doc_type, image_data=None, extracted_info=None, padding=True, ocr_method="Gemini"):
-    """Generate the document display area with glass effect and modern styling"""
+def get_document_display(doc_type, document=None, extracted_info=None, padding=True, ocr_method="Gemini", job_id=None):
+    """
+    Generate the document display area with glass effect and modern styling.
+    The uploaded document is referenced by preview/thumbnail URL rather than inlined.
+    With a job_id the display subscribes to the job's events and is swapped out when it finishes.
+    """
     
     icons = {
         "crbook": "car",
@@ -341,17 +421,9 @@ def get_document_display(doc_type, image_data=None, extracted_info=None, padding
         "invoice": "https://placehold.co/600x400?text=Upload+Invoice+PDF"
     }
 
-    # Detect if image_data contains PDF
-    is_pdf = False
-    if image_data:
-        try:
-            # Check first 8 base64 characters for PDF magic number
-            chunk = image_data[:8]
-            padding_needed = 4 - (len(chunk) % 4)
-            decoded = base64.b64decode(chunk + ('=' * padding_needed))
-            is_pdf = decoded.startswith(b'%PDF-')
-        except:
-            pass
+    # The version query busts the browser cache when a new file is uploaded
+    is_pdf = bool(document) and document.is_pdf
+    version = document.sha256[:16] if document else None
 
     return Div(
         Div(
@@ -360,12 +432,20 @@ def get_document_display(doc_type, image_data=None, extracted_info=None, padding
             Div(
                 # Show PDF embed or image based on detection
                 Embed(
-                    src=f"data:application/pdf;base64,{image_data}",
+                    src=f"/preview/{doc_type}?v={version}",
                     type="application/pdf",
                     cls="w-full h-96 rounded-lg",
                     title=f"{titles[doc_type]} Preview"
-                ) if is_pdf else Img(
-                    src=f"data:image/jpeg;base64,{image_data}" if image_data else placeholder[doc_type],
+                ) if is_pdf else A(
+                    Img(
+                        src=f"/thumbnail/{doc_type}?v={version}",
+                        alt=titles[doc_type],
+                        cls="rounded-lg object-contain w-full h-auto"
+                    ),
+                    href=f"/preview/{doc_type}?v={version}",
+                    target="_blank"
+                ) if document else Img(
+                    src=placeholder[doc_type],
                     alt=titles[doc_type],
                     cls="rounded-lg object-contain w-full h-auto"
                 ),
@@ -381,7 +461,7 @@ def get_document_display(doc_type, image_data=None, extracted_info=None, padding
             Alert(
                 AlertTitle(f"✅ {titles[doc_type]} Detected" if extracted_info and "Error" not in extracted_info else f"❌ No {titles[doc_type]} Detected") if extracted_info else None,
                 cls="mt-4 backdrop-blur-sm bg-white/10 glass"
-            ) if image_data and extracted_info else None,
+            ) if document and extracted_info else None,
             cls="w-full md:w-1/2 border-2 rounded-lg p-6"
         ),
         Div(
@@ -429,6 +509,12 @@ def get_document_display(doc_type, image_data=None, extracted_info=None, padding
                     )
                     for key, value in (extracted_info or {}).items()
                 ] if extracted_info else [
+                    Div(
+                        Lucide("loader", cls="w-4 h-4 mr-2 spinner"),
+                        f"Extracting {titles[doc_type]} information... this can take a while for multi-page documents",
+                        cls="flex items-center text-gray-500"
+                    )
+                ] if job_id else [
                     P(f"Upload and process a document to see extracted information for {titles[doc_type]}.",
                      cls="text-gray-500")
                 ],
@@ -437,7 +523,8 @@ def get_document_display(doc_type, image_data=None, extracted_info=None, padding
             cls="w-full md:w-1/2 border-2 rounded-lg p-6"
         ),
         id=f"{doc_type}-display",
-        cls="flex flex-col md:flex-row gap-6 mx-auto max-w-7xl w-full justify-center"
+        cls="flex flex-col md:flex-row gap-6 mx-auto max-w-7xl w-full justify-center",
+        **({"hx_ext": "sse", "sse_connect": f"/jobs/{job_id}/events", "sse_swap": "done", "hx_swap": "outerHTML"} if job_id else {})
     )
 
 def get_tabs():
@@ -529,7 +616,7 @@ def get():
     )
 
 @rt('/upload-image/{doc_type}')
-async def upload_image(req: Request, doc_type: str):
+async def upload_image(req: Request, session, doc_type: str):
     """Handle image upload for different document types"""
     if req.method != "POST":
         logger.warning(f"Invalid method {req.method} for upload")
@@ -560,14 +647,25 @@ async def upload_image(req: Request, doc_type: str):
             return "Empty file", 400
             
         # Store the image content
-        uploaded_images[doc_type] = content
+        await run_blocking(upload_store.put, upload_key(session, doc_type), content)
+        document = Document(content, filename=image.filename)
+        await run_blocking(getattr, document, "sha256")
         logger.info(f"Successfully uploaded {doc_type} image: {image.filename}")
         
         return Div(
             Script(f"document.getElementById('upload-container-{doc_type}').style.display = 'none';"),
-            get_document_display(doc_type=doc_type, image_data=base64.b64encode(content).decode())
+            get_document_display(doc_type=doc_type, document=document)
         )
             
+    except UploadTooLarge as e:
+        logger.warning(f"Rejected {doc_type} upload: {str(e)}")
+        return Alert(
+            AlertTitle("Upload Failed"),
+            AlertDescription(str(e)),
+            variant="destructive",
+            cls="mt-4"
+        ), 413
+
     except Exception as e:
         logger.error(f"Upload error for {doc_type}: {str(e)}", exc_info=True)
         return Alert(
@@ -578,47 +676,40 @@ async def upload_image(req: Request, doc_type: str):
         ), 500
 
 @rt('/process-ocr/{doc_type}')
-async def process_ocr(req: Request, doc_type: str):
+async def process_ocr(req: Request, session, doc_type: str):
     """Process OCR for different document types with validation"""
     try:
-        if not uploaded_images[doc_type]:
+        content = await run_blocking(upload_store.get, upload_key(session, doc_type))
+        if not content:
             raise ValueError(f"No {doc_type} image uploaded")
+        document = Document(content)
+        await run_blocking(getattr, document, "sha256")
         
-        if doc_type in ["electricity", "water"]:
-            from app.gemini.utility_bills import process_utility_bill
-            result = process_utility_bill(uploaded_images[doc_type], doc_type)
-        
-        elif doc_type == "invoice":
-            from app.gemini.invoice import process_gemini_vehicle_pdf
-            result = process_gemini_vehicle_pdf(uploaded_images[doc_type])
+        if doc_type in job_doc_types:
+            # Return straight away and let the display pick up the result over SSE
+            preview_key = job_upload_key(session, doc_type, document.sha256[:16])
+            await run_blocking(upload_store.put, preview_key, content)
+            job_id = await job_queue.submit(doc_type, content, preview_key=preview_key)
+            logger.info(f"Queued {doc_type} job {job_id}")
+            return Div(
+                get_document_display(doc_type, document=document, padding=False, job_id=job_id),
+            )
 
+        ocr_method = req.query_params.get("ocr", "gemini")
+        if ocr_method == "local" and doc_type in local_ocr_doc_types:
+            result = await ocr_service.run(doc_type, content)
         else:
-            result = process_gemini_cr_book(uploaded_images[doc_type]) if doc_type == "crbook" else (
-                process_gemini_licence(uploaded_images[doc_type]) if doc_type == "licence" else process_gemini_passport(uploaded_images[doc_type])
-            )
+            ocr_method = "Gemini"
+            result = await run_extractor(doc_type, document)
              
-        image_data = result.get('image_data') or result.get('pdf_data')
-        print(image_data)
         extracted_info = result['extracted_info']
-        
-        print(extracted_info)
+        logger.debug(f"Extracted {doc_type} info: {extracted_info}")
         
         # Validate the extracted information based on document type
-        if doc_type == "licence" and ("Licence Number" not in extracted_info or extracted_info["Licence Number"] == None or extracted_info["Nic Number"] == None):
-            extracted_info = { "Error": "Upload valid Driving Licence image" }
-        elif doc_type in ["electricity", "water"]:
-            required_fields = ["Name", "Address", "Total Due"]
-            if not all(result['extracted_info'].get(field) for field in required_fields):
-                result['extracted_info'] = {"Error": f"Invalid {doc_type.replace('_', ' ')} image"}
-        elif doc_type == "passport" and ("Passport Number" not in extracted_info or extracted_info["Passport Number"] == None or extracted_info["Nic Number"] == None):
-            extracted_info = { "Error": "Upload valid Passport image" }
-        elif doc_type == "crbook" and ("Registration Number" not in extracted_info or extracted_info["Registration Number"] == None):
-            extracted_info = { "Error": "Upload valid CR book image" }
-        elif doc_type == "invoice" and ("Chassis No" not in extracted_info or extracted_info["Chassis No"] is None):
-            extracted_info = { "Error": "Upload valid Invoice PDF" }
+        extracted_info = validate_extracted_info(doc_type, extracted_info)
         
         return Div(
-            get_document_display(doc_type, image_data=image_data, extracted_info=extracted_info, padding=False),
+            get_document_display(doc_type, document=document, extracted_info=extracted_info, padding=False, ocr_method=ocr_method),
         )
     
     except Exception as e:
@@ -630,17 +721,133 @@ async def process_ocr(req: Request, doc_type: str):
             cls="mt-4"
         ), 
 
+@rt('/preview/{doc_type}')
+async def preview(req: Request, session, doc_type: str):
+    """Stream the stored upload with its content type, ETag and byte-range support"""
+    content = await run_blocking(load_upload, session, doc_type, req.query_params.get("v"))
+    if not content:
+        return Response(status_code=404)
+    document = Document(content)
+    etag = f'"{await run_blocking(getattr, document, "sha256")}"'
+    return preview_response(req, content, document.mime_type, etag)
+
+@rt('/thumbnail/{doc_type}')
+async def thumbnail(req: Request, session, doc_type: str):
+    """Serve a server-rendered JPEG thumbnail of the stored upload"""
+    content = await run_blocking(load_upload, session, doc_type, req.query_params.get("v"))
+    if not content:
+        return Response(status_code=404)
+    document = Document(content)
+    etag = f'"{await run_blocking(getattr, document, "sha256")}-thumb"'
+    if not_modified(req, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    data = await run_blocking(make_thumbnail, document)
+    return Response(data, media_type="image/jpeg", headers={"ETag": etag, "Cache-Control": "private, max-age=3600"})
+
 @app.post("/extract-pdf")
 async def extract_pdf(file: UploadFile = File(...)):
-    result = process_gemini_vehicle_pdf(await file.read())
-    return result
+    document = Document(await file.read(), filename=file.filename)
+    result = await run_extractor("invoice", document)
+    return {"pdf_data": await run_blocking(getattr, document, "base64"), **result}
+
+@app.post("/jobs/{doc_type}")
+async def submit_job(req: Request, doc_type: str):
+    """Queue an uploaded document (form field `file`) for background extraction"""
+    if doc_type not in extractors.EXTRACTORS:
+        return JSONResponse({"error": f"Unknown document type {doc_type}"}, status_code=404)
+    form = await req.form()
+    upload = form.get("file")
+    if not isinstance(upload, UploadFile) or not upload.filename:
+        return JSONResponse({"error": "No file uploaded"}, status_code=400)
+    job_id = await job_queue.submit(doc_type, await upload.read())
+    return JSONResponse({"job_id": job_id, "status_url": f"/jobs/{job_id}", "events_url": f"/jobs/{job_id}/events"}, status_code=202)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Poll the status and result of a background job"""
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        return JSONResponse({"error": "Job not found"}, status_code=404)
+    # The preview key names the submitting session's uploads
+    job.pop("preview_key")
+    return job
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Server-Sent Events for a job: `status` events carry JSON status updates and the
+    final `done` event carries the rendered document display for HTMX to swap in.
+    """
+    async def events():
+        async for job in job_queue.wait(job_id):
+            if job["status"] not in (DONE, FAILED):
+                yield f"event: status\ndata: {json.dumps({'id': job_id, 'status': job['status']})}\n\n"
+                continue
+            content = await run_blocking(upload_store.get, job["preview_key"]) if job["preview_key"] else None
+            document = Document(content) if content else None
+            if document:
+                await run_blocking(getattr, document, "sha256")
+            extracted_info = (
+                validate_extracted_info(job["doc_type"], job["result"])
+                if job["status"] == DONE else {"Error": job["error"]}
+            )
+            display = get_document_display(
+                job["doc_type"],
+                document=document,
+                extracted_info=extracted_info,
+                padding=False
+            )
+            yield "event: done\n" + "".join(f"data: {line}\n" for line in to_xml(display).splitlines()) + "\n"
+            # The swapped-in display ends the stream; its preview falls back to the session's upload
+            if job["preview_key"]:
+                await run_blocking(upload_store.delete, job["preview_key"])
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/batch")
+async def batch(req: Request):
+    """
+    Extract many documents in one request and stream NDJSON results as they finish.
+    Use the doc type as the form field name (crbook=@a.jpg) or upload a zip with one
+    folder per doc type. ?doc_type= sets the fallback, ?concurrency= lowers the limit.
+    """
+    try:
+        concurrency = min(int(req.query_params.get("concurrency", BATCH_CONCURRENCY)), BATCH_CONCURRENCY)
+    except ValueError:
+        return JSONResponse({"error": "concurrency must be an integer"}, status_code=400)
+    form = await req.form()
+    documents = await read_batch_documents(form, req.query_params.get("doc_type"))
+    logger.info(f"Starting batch of {len(documents)} documents with concurrency {concurrency}")
+    return StreamingResponse(
+        run_batch(documents, run_extractor, concurrency=concurrency),
+        media_type="application/x-ndjson"
+    )
+
+@app.get("/cache-stats")
+async def cache_stats():
+    """Return result cache hit/miss counters"""
+    return result_cache.snapshot()
+
+@app.get("/stats")
+async def stats():
+    """Return cache counters, the bytes saved by image preprocessing, model response counters, PDF text layer and OCR worker metrics"""
+    return {
+        "cache": result_cache.snapshot(),
+        "preprocess": preprocess_stats,
+        "responses": response_stats,
+        "batches": batch_stats,
+        "prompt_cache": prompt_cache_stats,
+        "model_calls": {"gemini": gemini_calls.snapshot(), "openai": openai_calls.snapshot()},
+        "text_layer": text_layer_stats,
+        "ocr": ocr_service.snapshot(),
+    }
 
 
 @rt('/clear/{doc_type}')
-async def clear(req: Request, doc_type: str):
+async def clear(req: Request, session, doc_type: str):
     """Clear uploaded image with error handling"""
     try:
-        uploaded_images[doc_type] = None
+        await run_blocking(upload_store.delete, upload_key(session, doc_type))
         logger.info(f"Cleared {doc_type} image")
         
         return Div(
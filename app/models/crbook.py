@@ -18,7 +18,7 @@ class CRBookInfo(BaseModel):
     absolute_owner: Optional[str] = Field(None, description="Name of the absolute owner")
     absolute_owner_reference_date: Optional[date] = Field(None, description="Reference date for absolute owner")
     previous_owners: Optional[int] = Field(None, description="Number of previous owners")
-    previous_owner_details: Optional[List[str]] = Field(None, description="List of previous owner details")
+    previous_owner_details: Optional[List[str]] = Field(None, description="List of previous owner details, one string per owner. Example: '1. Name = Mercantile investments and finance 3, Address = No 236, Galle road, Colombo 03, Transfered Date = 23/11/2016'")
     make: Optional[str] = Field(None, description="Make of the vehicle")
     model: Optional[str] = Field(None, description="Model of the vehicle")
     color: Optional[str] = Field(None, description="Color of the vehicle")
@@ -27,10 +27,10 @@ class CRBookInfo(BaseModel):
     wheelbase: Optional[str] = Field(None, description="Wheelbase of the vehicle")
     seating_capacity: Optional[str] = Field(None, description="Seating capacity of the vehicle")
     gross_weight: Optional[str] = Field(None, description="Gross weight of the vehicle")
-    unladen_weight: Optional[str] = Field(None, description="Unladen weight of the vehicle")
+    unladen_weight: Optional[str] = Field(None, description="Unladen weight of the vehicle in KG")
     type_of_body: Optional[str] = Field(None, description="Type of body of the vehicle")
     overhang: Optional[str] = Field(None, description="Overhang details of the vehicle")
     tire_size_front: Optional[str] = Field(None, description="Front tire size")
     tire_size_rear: Optional[str] = Field(None, description="Rear tire size")
-    vehicle_dimensions: Optional[str] = Field(None, description="Vehicle dimensions (length, width, height)")
+    vehicle_dimensions: Optional[str] = Field(None, description="Vehicle dimensions (length = value, width = value, height = value)")
     printed_date: Optional[date] = Field(None, description="Date printed in YYYY-MM-DD format")
\ No newline at end of file
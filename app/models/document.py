@@ -0,0 +1,82 @@
+import base64
+import hashlib
+from functools import cached_property
+from io import BytesIO
+import PIL.Image
+
+# Leading bytes used to sniff the MIME type of an upload
+MAGIC_NUMBERS = (
+    (b"%PDF-", "application/pdf"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"BM", "image/bmp"),
+)
+
+
+class Document:
+    """
+    An uploaded document passed through every extractor. It owns the raw bytes once;
+    the decoded image, base64 text and hash are derived lazily and cached, so each
+    transformation happens at most once per request.
+    """
+
+    def __init__(self, content: bytes, filename: str = None, mime_type: str = None):
+        self.content = content
+        self.filename = filename
+        self._mime_type = mime_type
+
+    @classmethod
+    def from_upload(cls, uploaded, filename: str = None) -> "Document":
+        """Wrap bytes or a file-like object; Documents are returned unchanged"""
+        if isinstance(uploaded, Document):
+            return uploaded
+        if isinstance(uploaded, (bytes, bytearray, memoryview)):
+            return cls(bytes(uploaded), filename=filename)
+        content = uploaded.read()
+        uploaded.seek(0)  # Reset file pointer for later use
+        return cls(content, filename=filename or getattr(uploaded, "name", None))
+
+    @property
+    def mime_type(self) -> str:
+        if self._mime_type is None:
+            self._mime_type = sniff_mime_type(self.content)
+        return self._mime_type
+
+    @property
+    def is_pdf(self) -> bool:
+        return self.mime_type == "application/pdf"
+
+    @cached_property
+    def sha256(self) -> str:
+        return hashlib.sha256(self.content).hexdigest()
+
+    @cached_property
+    def base64(self) -> str:
+        return base64.b64encode(self.content).decode("utf-8")
+
+    @cached_property
+    def image(self) -> PIL.Image.Image:
+        """Decoded image, opened on first access (PDFs have no image view)"""
+        if self.is_pdf:
+            raise ValueError("PDF documents have no image view")
+        return PIL.Image.open(BytesIO(self.content))
+
+    def __len__(self):
+        return len(self.content)
+
+    def __bool__(self):
+        return bool(self.content)
+
+
+def sniff_mime_type(content: bytes) -> str:
+    """Guess the MIME type from the leading bytes, defaulting to JPEG"""
+    for magic, mime_type in MAGIC_NUMBERS:
+        if content.startswith(magic):
+            return mime_type
+    if content[:4] == b"RIFF" and content[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/jpeg"
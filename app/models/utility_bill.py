@@ -0,0 +1,10 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class UtilityBillInfo(BaseModel):
+    name: Optional[str] = Field(..., description="Account holder's name, exactly as on the document")
+    address: Optional[str] = Field(..., description="Service address without asterisks, only text and numbers (house numbers like 25/1 or 26,)")
+    current_charge: Optional[str] = Field(None, description="Current month charges (number only, two decimal places)")
+    previous_due: Optional[str] = Field(None, description="Previous balance/arrears (number only, two decimal places)")
+    outstanding_due: Optional[str] = Field(None, description="Outstanding Amount / Dues Previous month (number only, with +/- sign)")
+    total_due: Optional[str] = Field(..., description="Total amount due (number only, two decimal places)")
\ No newline at end of file
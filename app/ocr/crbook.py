@@ -1,27 +1,60 @@
+import os
 import re
-from paddleocr import PaddleOCR
 from PIL import Image
 import numpy as np
 import cv2
-from fuzzywuzzy import fuzz
 import logging
 from collections import defaultdict
+from functools import cached_property
 import base64
-import pytesseract
+from app.ocr.engine import detect_text, recognize_text, run_ocr, run_ocr_parallel
+from app.ocr.rules import Rule, RuleSet
+from app.ocr.vocabulary import Vocabulary
+
+logger = logging.getLogger(__name__)
+
+# single_pass: detect once on the cropped page and recognise only the boxes inside
+# field regions; per_field: the original full OCR pass on every field crop
+CRBOOK_OCR_MODE = os.getenv("CRBOOK_OCR_MODE", "single_pass")
+
+# Outline detection runs on a copy downscaled to this long edge (0 = full resolution);
+# the borders found are then refined in a narrow band of the full resolution image
+OUTLINE_MAX_EDGE = int(os.getenv("CRBOOK_OUTLINE_MAX_EDGE", 1200))
+
+# Keywords that are typically found in CR book images
+CR_BOOK_KEYWORDS = ["REGISTRATION", "CHASSIS", "ENGINE", "CYLINDER", "VEHICLE", "TAXATION", "STATUS", "FUEL"]
+
+# - PageImage
+# One decoded upload shared by every stage of a request. Each request owns its
+# own instance, so concurrent requests never share pixels or temp files.
+class PageImage:
+    def __init__(self, image):
+        if isinstance(image, np.ndarray):
+            self.bgr = image
+        else:
+            self.bgr = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_COLOR)
+        if self.bgr is None:
+            raise ValueError("Could not decode image")
+
+    @cached_property
+    def rgb(self):
+        return cv2.cvtColor(self.bgr, cv2.COLOR_BGR2RGB)
 
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+    @cached_property
+    def gray(self):
+        return cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
 
-# Initialize logging and PaddleOCR
-logging.getLogger('ppocr').setLevel(logging.ERROR)
-ocr = PaddleOCR(lang='en')
+    @cached_property
+    def binary(self):
+        """Inverted Otsu binarisation shared by the vertical and horizontal detectors"""
+        _, img_bin = cv2.threshold(self.gray, 128, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+        return 255 - img_bin
 
 # - vertical_detector()
 # Function to filter vertical lines
-def vertical_detector(image_path):
-    img = cv2.imread(image_path, 0)
-    _, img_bin = cv2.threshold(img, 128, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
-    img_bin = 255 - img_bin
-    kernel_length = np.array(img).shape[1] // 40
+def vertical_detector(page):
+    img_bin = page.binary
+    kernel_length = img_bin.shape[1] // 40
     verticle_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, kernel_length))
     kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
     img_temp1 = cv2.erode(img_bin, verticle_kernel, iterations=3)
@@ -30,57 +63,77 @@ def vertical_detector(image_path):
     _, img_final_bin = cv2.threshold(img_final_bin, 128, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
     return img_final_bin
 
+# - cluster_line_points()
+# Function to group Hough endpoints into lines along one axis
+def cluster_line_points(points, axis, threshold=5):
+    """
+    Group points whose coordinate on `axis` lies within `threshold` of a group's
+    anchor (the first point that started the group), returning per group, in
+    creation order, the truncated mean coordinate and the min/max of the other
+    coordinate. Matches assigning points one at a time to the first anchor in range.
+    """
+    coords = points[:, axis].astype(np.int64)
+    others = points[:, 1 - axis].astype(np.int64)
+
+    # The first point not yet within range of an anchor starts a new group
+    anchors = []
+    uncovered = np.ones(len(coords), dtype=bool)
+    while uncovered.any():
+        first = coords[np.argmax(uncovered)]
+        anchors.append(first)
+        uncovered &= np.abs(coords - first) > threshold
+    anchors = np.array(anchors, dtype=np.int64)
+
+    # Each point joins the earliest created anchor in range; anchors are more than
+    # `threshold` apart, so only a handful can be in range of any point
+    order = np.argsort(anchors, kind="stable")
+    sorted_anchors = anchors[order]
+    low = np.searchsorted(sorted_anchors, coords - threshold, side="left")
+    high = np.searchsorted(sorted_anchors, coords + threshold, side="right")
+    candidates = low[:, None] + np.arange(max(1, (high - low).max(initial=0)))
+    in_range = candidates < high[:, None]
+    creation = np.where(in_range, order[np.minimum(candidates, len(order) - 1)], len(anchors))
+    groups = creation.min(axis=1)
+
+    counts = np.bincount(groups, minlength=len(anchors))
+    sums = np.bincount(groups, weights=coords, minlength=len(anchors))
+    mins = np.full(len(anchors), np.iinfo(np.int64).max)
+    maxs = np.full(len(anchors), np.iinfo(np.int64).min)
+    np.minimum.at(mins, groups, others)
+    np.maximum.at(maxs, groups, others)
+    return (sums / counts).astype(np.int64), mins, maxs
+
+# - hough_line_points()
+# Function to return the endpoints of the Hough line segments as an (n, 2) array
+def hough_line_points(gray):
+    edges = cv2.Canny(gray, 50, 150, apertureSize=3)
+    minLineLength = 100
+    lines = cv2.HoughLinesP(image=edges, rho=1, theta=np.pi/180, threshold=100, lines=np.array([]), minLineLength=minLineLength, maxLineGap=80)
+    if lines is None or lines.size == 0:
+        return None
+    # Each segment contributes (x1, y1) then (x2, y2)
+    return lines.reshape(-1, 2)
+
 # - detect_and_draw_v_lines()
 # Function to detect the two vertical lines of the outline
 def detect_and_draw_v_lines(input_image):
-    gray = cv2.cvtColor(input_image, cv2.COLOR_BGR2GRAY)
+    gray = input_image if input_image.ndim == 2 else cv2.cvtColor(input_image, cv2.COLOR_BGR2GRAY)
     height, width = gray.shape
-    edges = cv2.Canny(gray, 50, 150, apertureSize=3)
-    minLineLength = 100
-    lines = cv2.HoughLinesP(image=edges, rho=1, theta=np.pi/180, threshold=100, lines=np.array([]), minLineLength=minLineLength, maxLineGap=80)
-    points = []
-    if lines is not None:
-        a, _, _ = lines.shape
-        for i in range(a):
-            x1, y1, x2, y2 = lines[i][0]
-            points.append((x1, y1))
-            points.append((x2, y2))
-    threshold = 5
-    groups = defaultdict(list)
-    for x, y in points:
-        aligned = False
-        for key in groups.keys():
-            if abs(x - key) <= threshold:
-                groups[key].append((x, y))
-                aligned = True
-                break
-        if not aligned:
-            groups[x].append((x, y))
-    single_lines = []
-    for key, group in groups.items():
-        xs = [x for x, y in group]
-        ys = [y for x, y in group]
-        avg_x = int(np.mean(xs))
-        min_y = min(ys)
-        max_y = max(ys)
-        length = max_y - min_y
-        if length > 0.25 * height:
-            single_lines.append((avg_x, min_y, avg_x, max_y, length))
-    if len(single_lines) >= 2:
-        single_lines.sort()
-        max_distance = 0
-        line1 = None
-        line2 = None
-        for i in range(len(single_lines) - 1):
-            for j in range(i + 1, len(single_lines)):
-                distance = abs(single_lines[j][0] - single_lines[i][0])
-                if distance > max_distance:
-                    max_distance = distance
-                    line1 = single_lines[i]
-                    line2 = single_lines[j]
-
-    if line1[0] > line2[0]:
-        line1, line2 = line2, line1
+    points = hough_line_points(gray)
+    if points is None:
+        raise ValueError("No vertical lines detected")
+    avg_x, min_y, max_y = cluster_line_points(points, axis=0)
+    length = max_y - min_y
+    keep = length > 0.25 * height
+    single_lines = sorted(zip(avg_x[keep].tolist(), min_y[keep].tolist(), avg_x[keep].tolist(), max_y[keep].tolist(), length[keep].tolist()))
+    if len(single_lines) < 2 or single_lines[0][0] == single_lines[-1][0]:
+        raise ValueError("Expected two distinct vertical lines")
+
+    # Sorted by x, so the widest pair is the first line and the first line at the max x
+    xs = [line[0] for line in single_lines]
+    line1 = single_lines[0]
+    line2 = single_lines[xs.index(xs[-1])]
+
     image_width = gray.shape[1]
     if line1[0] / image_width > 0.35:
         line1 = (0, line1[1], 0, line1[3])
@@ -91,11 +144,9 @@ def detect_and_draw_v_lines(input_image):
 
 # - horizontal_detector()
 # Function to filter horizontal lines
-def horizontal_detector(image_path):
-    img = cv2.imread(image_path, 0)
-    _, img_bin = cv2.threshold(img, 128, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
-    img_bin = 255 - img_bin
-    kernel_length = np.array(img).shape[1] // 40
+def horizontal_detector(page):
+    img_bin = page.binary
+    kernel_length = img_bin.shape[1] // 40
     hori_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_length, 1))
     kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
     img_temp2 = cv2.erode(img_bin, hori_kernel, iterations=3)
@@ -106,69 +157,45 @@ def horizontal_detector(image_path):
 
 # - detect_and_draw_h_lines()
 # Function to detect the two horizontal lines of the outline
-def detect_and_draw_h_lines(image):
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    edges = cv2.Canny(gray, 50, 150, apertureSize=3)
-    minLineLength = 100
-    lines = cv2.HoughLinesP(image=edges, rho=1, theta=np.pi/180, threshold=100, lines=np.array([]), minLineLength=minLineLength, maxLineGap=80)
-    if lines is None:
-        print("No lines detected")
+def detect_and_draw_h_lines(image, edge_margin=150):
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    points = hough_line_points(gray)
+    if points is None:
+        logger.debug("No lines detected")
         return
-    points = []
-    a, _, _ = lines.shape
-    for i in range(a):
-        x1, y1, x2, y2 = lines[i][0]
-        points.append((x1, y1))
-        points.append((x2, y2))
-    threshold = 5
-    groups = defaultdict(list)
-    for x, y in points:
-        aligned = False
-        for key in groups.keys():
-            if abs(y - key) <= threshold:
-                groups[key].append((x, y))
-                aligned = True
-                break
-        if not aligned:
-            groups[y].append((x, y))
+    avg_y, min_x, max_x = cluster_line_points(points, axis=1)
     document_width = image.shape[1]
     min_line_length = 0.25 * document_width
-    constructed_lines = []
-    for key, group in groups.items():
-        avg_y = int(np.mean([y for x, y in group]))
-        min_x = min([x for x, y in group])
-        max_x = max([x for x, y in group])
-        line_length = max_x - min_x
-        if line_length >= min_line_length:
-            constructed_lines.append((min_x, avg_y, max_x, avg_y))
-    max_distance = 0
-    line1 = None
-    line2 = None
-    for i in range(len(constructed_lines)):
-        for j in range(i + 1, len(constructed_lines)):
-            _, y1, _, _ = constructed_lines[i]
-            _, y2, _, _ = constructed_lines[j]
-            distance = abs(y1 - y2)
-            if distance > max_distance:
-                max_distance = distance
-                line1 = constructed_lines[i]
-                line2 = constructed_lines[j]
+    keep = (max_x - min_x) >= min_line_length
+    constructed_lines = list(zip(min_x[keep].tolist(), avg_y[keep].tolist(), max_x[keep].tolist(), avg_y[keep].tolist()))
+    ys = avg_y[keep]
+    if len(ys) < 2 or ys.min() == ys.max():
+        raise ValueError("Expected two distinct horizontal lines")
+
+    # The widest pair joins the lowest and highest y; take the first such pair
+    # in (i, j) order, as the pairwise scan did
+    extremes = (ys == ys.min()) | (ys == ys.max())
+    i = int(np.argmax(extremes))
+    opposite = ys == (ys.max() if ys[i] == ys.min() else ys.min())
+    opposite[:i + 1] = False
+    j = int(np.argmax(opposite))
+    line1 = constructed_lines[i]
+    line2 = constructed_lines[j]
 
     if line1[1] > line2[1]:
         line1, line2 = line2, line1
-    if line1[1] > 150:
+    if line1[1] > edge_margin:
         line1 = (line1[0], 0, line1[2], 0)
     image_height = image.shape[0]
-    if image_height - line2[1] > 150:
+    if image_height - line2[1] > edge_margin:
         line2 = (line2[0], image_height, line2[2], image_height)
     horizontal_lines = [line1[1], line2[1]]
     return horizontal_lines
 
 # - create_image_with_lines()
 # Function to crop the image through the outline and return it
-def create_image_with_lines(image_path, vertical_lines, horizontal_lines):
-    image = Image.open(image_path)
-    width, height = image.size
+def create_image_with_lines(page, vertical_lines, horizontal_lines):
+    height, width = page.gray.shape
     #print("Original Image size:", image.size)
 
     # Ensure we have exactly two vertical and two horizontal lines
@@ -184,35 +211,70 @@ def create_image_with_lines(image_path, vertical_lines, horizontal_lines):
     top = horizontal_lines[0]
     bottom = horizontal_lines[1]
 
-    # Crop the image
-    cropped_image = image.crop((left, top, right, bottom))
+    # Crop the image (a view of the shared decode, copied once into the PIL image)
+    cropped_image = Image.fromarray(page.rgb[top:bottom, left:right])
     #print("Cropped image size:", cropped_image.size)
 
     return cropped_image
 
-# - outline_detection_pipeline()
-# Construct a single pipeline upto cropping throgh the outline
-def outline_detection_pipeline(image_path):
-    vertical_lines_image = vertical_detector(image_path)
-    vertical_lines_image = cv2.cvtColor(vertical_lines_image, cv2.COLOR_GRAY2BGR)
+# - detect_outline()
+# Function to find the x of the two vertical and the y of the two horizontal borders
+def detect_outline(page, edge_margin=150):
+    vertical_lines_image = vertical_detector(page)
     vertical_lines = detect_and_draw_v_lines(vertical_lines_image)
     #print("The X Co-Ordianates of Vertical lines to crop:", vertical_lines)
 
-    horizontal_lines_image = horizontal_detector(image_path)
-    horizontal_lines_image = cv2.cvtColor(horizontal_lines_image, cv2.COLOR_GRAY2BGR)
-    horizontal_lines = detect_and_draw_h_lines(horizontal_lines_image)
+    horizontal_lines_image = horizontal_detector(page)
+    horizontal_lines = detect_and_draw_h_lines(horizontal_lines_image, edge_margin)
     #print("The Y Co-Ordinates of Horizontal lines to crop:", horizontal_lines)
+    return vertical_lines, horizontal_lines
+
+# - refine_border()
+# Function to map a border found on the downscaled image back to full resolution
+def refine_border(page, position, scale, vertical, band):
+    binary = page.binary
+    limit = binary.shape[1] if vertical else binary.shape[0]
+    small_limit = round(limit * scale)
+    # Borders snapped to the image edge stay on the edge
+    if position <= 0:
+        return 0
+    if position >= small_limit:
+        return limit
+
+    # Snap to the row/column with the most line pixels near the mapped position
+    center = int(round(position / scale))
+    low, high = max(0, center - band), min(limit, center + band + 1)
+    strip = binary[:, low:high] if vertical else binary[low:high, :]
+    profile = np.count_nonzero(strip, axis=0 if vertical else 1)
+    return low + int(np.argmax(profile))
 
-    cropped_image = create_image_with_lines(image_path, vertical_lines, horizontal_lines)
+# - outline_detection_pipeline()
+# Construct a single pipeline upto cropping throgh the outline
+def outline_detection_pipeline(page):
+    if not isinstance(page, PageImage):
+        page = PageImage(page)
+
+    height, width = page.bgr.shape[:2]
+    scale = OUTLINE_MAX_EDGE / max(height, width) if OUTLINE_MAX_EDGE else 1
+    if scale >= 1:
+        vertical_lines, horizontal_lines = detect_outline(page)
+    else:
+        # Threshold, morphology and Hough run on the small copy only
+        small = PageImage(cv2.resize(page.bgr, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA))
+        vertical_lines, horizontal_lines = detect_outline(small, edge_margin=150 * scale)
+        # The small image's morphology shifts borders by a few of its pixels
+        band = int(np.ceil(6 / scale))
+        vertical_lines = [refine_border(page, x, scale, True, band) for x in vertical_lines]
+        if horizontal_lines is not None:
+            horizontal_lines = [refine_border(page, y, scale, False, band) for y in horizontal_lines]
+
+    cropped_image = create_image_with_lines(page, vertical_lines, horizontal_lines)
     return cropped_image
 
 
-# - perform_ocr_on_cropped_image()
-# Function to perform OCR on cropped image
-def perform_ocr_on_cropped_image(cropped_image, ocr_coords_percentage, threshold_percentage=0):
-    cropped_rgb = np.array(cropped_image.convert('RGB'))
-    height, width, _ = cropped_rgb.shape
-
+# - field_region()
+# Function to turn a field's percentage coordinates into a pixel rectangle
+def field_region(ocr_coords_percentage, threshold_percentage, width, height):
     # Calculate top left and bottom right coordinates with threshold
     top_left = (int((ocr_coords_percentage[0] - threshold_percentage) * width / 100),
                 int((ocr_coords_percentage[1] - threshold_percentage) * height / 100))
@@ -222,20 +284,31 @@ def perform_ocr_on_cropped_image(cropped_image, ocr_coords_percentage, threshold
     # Ensure coordinates are within image boundaries
     top_left = (max(0, top_left[0]), max(0, top_left[1]))
     bottom_right = (min(width, bottom_right[0]), min(height, bottom_right[1]))
+    return top_left, bottom_right
+
+# - crop_field()
+# Function to crop a field's OCR zone out of the cropped page array
+def crop_field(cropped_rgb, ocr_coords_percentage, threshold_percentage=0):
+    height, width, _ = cropped_rgb.shape
+    top_left, bottom_right = field_region(ocr_coords_percentage, threshold_percentage, width, height)
 
     #print("top_left Co-Ordinate of OCR zone on cropped image:", top_left[0], top_left[1])
     #print("bottom_right Co-Ordinate of OCR zone on cropped image:", bottom_right[0], bottom_right[1])
 
     # Crop the region for OCR
-    ocr_area = cropped_rgb[top_left[1]:bottom_right[1], top_left[0]:bottom_right[0]]
+    return cropped_rgb[top_left[1]:bottom_right[1], top_left[0]:bottom_right[0]]
 
-    # Perform OCR using PaddleOCR
-    ocr = PaddleOCR(lang='en', use_gpu=False)
-    #ocr = PaddleOCR(lang='en')
-    result = ocr.ocr(ocr_area, cls=True)
+# - perform_ocr_on_cropped_image()
+# Function to perform OCR on cropped image
+def perform_ocr_on_cropped_image(cropped_image, ocr_coords_percentage, threshold_percentage=0):
+    cropped_rgb = np.array(cropped_image.convert('RGB'))
+    ocr_area = crop_field(cropped_rgb, ocr_coords_percentage, threshold_percentage)
+
+    # Perform OCR using the shared PaddleOCR engine
+    result = run_ocr(ocr_area, cls=True)
 
     if result is None or len(result) == 0:
-        print("No text detected in the specified area.")
+        logger.debug("No text detected in the specified area.")
         return
     #Display the OCR area
     # plt.imshow(ocr_area)
@@ -244,294 +317,287 @@ def perform_ocr_on_cropped_image(cropped_image, ocr_coords_percentage, threshold
 
     return result
 
-# - All process_ocr_result_* functions
-def process_ocr_result_reg_no(result):
-    regex_pattern = r'(?:[a-zA-Z]{2,3}-?\d{4}|[0-9]+-[0-9]+)$' # minimum 2/3 letters then "-" or without "-" then 4 four digits
-    detected_texts = []
-
-    for page in result:
-        if page is None:
-            continue
-        for line in page:
-            if line is None:
-                continue
-            text = line[1][0]
-            text = str(text)
-            if re.search(regex_pattern, text):
-                detected_text = text
-                detected_texts.append(detected_text)
-
-    if len(detected_texts) == 0:
-        return "Oops, No pattern match text found"  # Handle the case where no matching text is found
-
-    # List of prefixes to check for
-    prefixes = ["WP", "CP", "SP", "NP", "EP", "NW", "NC", "SG", "UW", "80"]
+# - perform_ocr_on_fields()
+# Function to OCR every field region concurrently
+def perform_ocr_on_fields(cropped_image):
+    """Run the field crops through the shared OCR pool and return {field: result}"""
+    cropped_rgb = np.array(cropped_image.convert('RGB'))
+    areas = [crop_field(cropped_rgb, coords, threshold) for coords, threshold, _ in field_params.values()]
+
+    results = {}
+    for field, result in zip(field_params, run_ocr_parallel(areas, cls=True)):
+        if result is None or len(result) == 0:
+            logger.debug(f"No text detected in the {field} area.")
+            result = None
+        results[field] = result
+    return results
+
+# - single_pass_ocr()
+# Function to detect text once over the cropped page and recognise only the field regions
+def single_pass_ocr(cropped_image):
+    """
+    Run text detection once over the page and recognise every box in one batch;
+    boxes whose centre falls in a field region make up that field's result. Returns
+    the per-field results in PaddleOCR's [[box, (text, score)], ...] page format and
+    the text of every box on the page (labels included) for the CR book check.
+    """
+    cropped_rgb = np.array(cropped_image.convert('RGB'))
+    height, width, _ = cropped_rgb.shape
+    regions = {
+        field: field_region(coords, threshold, width, height)
+        for field, (coords, threshold, _) in field_params.items()
+    }
 
-    for text in detected_texts:
-        modified_text = text  # Start with the original text
+    # Read boxes top to bottom, left to right like a full OCR pass does
+    boxes = sorted((np.array(box) for box in detect_text(cropped_rgb)), key=lambda box: (box[0][1], box[0][0]))
+    assignments = {field: [] for field in field_params}
+    for index, box in enumerate(boxes):
+        center_x, center_y = box.mean(axis=0)
+        for field, (top_left, bottom_right) in regions.items():
+            if top_left[0] <= center_x < bottom_right[0] and top_left[1] <= center_y < bottom_right[1]:
+                assignments[field].append(index)
+
+    # Boxes outside the field regions hold the page labels the keyword check looks for
+    crops = []
+    for box in boxes:
+        left, top = np.floor(box.min(axis=0)).astype(int).clip(0)
+        right, bottom = np.ceil(box.max(axis=0)).astype(int)
+        crops.append(cropped_rgb[top:bottom, left:right])
+    recognised = recognize_text(crops)
+
+    lines = [[box.tolist(), text] for box, text in zip(boxes, recognised)]
+    field_results = {
+        field: [[lines[i] for i in indexes] or None]
+        for field, indexes in assignments.items()
+    }
+    return field_results, [text for text, _ in recognised]
 
-        # Check if the text starts with any of the specified prefixes
-        for prefix in prefixes:
-            if text.startswith(prefix):
-                # Only add a space if there isn't one already after the prefix
-                if not text[len(prefix):].startswith(" "):
-                    modified_text = prefix + " " + text[len(prefix):]
-                break  # No need to check other prefixes once a match is found
+# - contains_cr_book_keywords()
+# Function to check recognised texts for CR book keywords
+def contains_cr_book_keywords(texts):
+    for text in texts:
+        text = str(text).upper()
+        if any(keyword in text for keyword in CR_BOOK_KEYWORDS):
+            return True
+    return False
 
-        REGISTRATION_NO = modified_text
-        return REGISTRATION_NO  # Return the first valid registration number found
+# - All process_ocr_result_* functions
+# Each field's OCR lines are parsed by that field's RuleSet in a single pass; the
+# patterns compile once at import and rule timings are counted in rule_stats
+
+# - ocr_lines()
+# Function to join the recognised lines of a field's OCR result into RuleSet text
+def ocr_lines(result):
+    return "\n".join(
+        str(line[1][0])
+        for page in result if page is not None
+        for line in page if line is not None
+    )
+
+# - matched_line()
+# Function to return the whole OCR line a rule matched in
+def matched_line(match, lines, i):
+    return lines[i]
+
+# List of prefixes to check for
+REG_NO_PREFIXES = ["WP", "CP", "SP", "NP", "EP", "NW", "NC", "SG", "UW", "80"]
+
+def format_reg_no(match, lines, i):
+    text = lines[i]
+    # Check if the text starts with any of the specified prefixes
+    for prefix in REG_NO_PREFIXES:
+        if text.startswith(prefix):
+            # Only add a space if there isn't one already after the prefix
+            if not text[len(prefix):].startswith(" "):
+                return prefix + " " + text[len(prefix):]
+            break  # No need to check other prefixes once a match is found
+    return text
+
+reg_no_rules = RuleSet("crbook_reg_no", [
+    # minimum 2/3 letters then "-" or without "-" then 4 four digits
+    Rule("reg_no", "Registration Number", r'(?:[a-zA-Z]{2,3}-?\d{4}|[0-9]+-[0-9]+)$', format_reg_no, first_only=True),
+])
 
-    return "Oops, No pattern match text found"  # Return a message if no valid text is found
+def process_ocr_result_reg_no(result):
+    reg_no = reg_no_rules.apply(ocr_lines(result))["Registration Number"]
+    if reg_no is None:
+        return "Oops, No pattern match text found"  # Handle the case where no matching text is found
+    return reg_no  # Return the first valid registration number found
+
+CHASSIS_NO_PATTERNS = [
+    r'^(?=.*[A-Z].*[A-Z])(?=.*[0-9].*[0-9])[A-Za-z0-9]{17}$',  # 17 character string with at least 2 capital letters and 2 numbers
+    r'^(?=.*[A-Z].*[A-Z])(?=.*[0-9].*[0-9])[A-Za-z0-9]{16}$',  # 16 character string with at least 2 capital letters and 2 numbers
+    r'^(?=.*[A-Z].*[A-Z])(?=.*[0-9].*[0-9])[A-Za-z0-9-]{13}$',  # 13 character string with at least 2 capital letters, 2 numbers and a '-'
+    r'^(?=.*[A-Z].*[A-Z])(?=.*[0-9].*[0-9])[A-Za-z0-9-]{14}$',  # 14 character string with at least 2 capital letters, 2 numbers and a '-'
+    r'^(?=.*[A-Z].*[A-Z])(?=.*[0-9].*[0-9])[A-Za-z0-9-]{18}$',  # 18 character string with at least 2 capital letters, 2 numbers and a '-'
+    r'^[A-Za-z]{17}$'  # 17 character string with all letters
+]
+
+chassis_no_rules = RuleSet("crbook_chassis_no", [
+    # The first line matching any of the shapes
+    Rule("chassis_no", "Chassis Number", "|".join(f"(?:{pattern})" for pattern in CHASSIS_NO_PATTERNS), matched_line, first_only=True),
+])
 
 def process_ocr_result_chassis_no(result):
-    # Define regex patterns
-    patterns = [
-        r'^(?=.*[A-Z].*[A-Z])(?=.*[0-9].*[0-9])[A-Za-z0-9]{17}$',  # 17 character string with at least 2 capital letters and 2 numbers
-        r'^(?=.*[A-Z].*[A-Z])(?=.*[0-9].*[0-9])[A-Za-z0-9]{16}$',  # 16 character string with at least 2 capital letters and 2 numbers
-        r'^(?=.*[A-Z].*[A-Z])(?=.*[0-9].*[0-9])[A-Za-z0-9-]{13}$',  # 13 character string with at least 2 capital letters, 2 numbers and a '-'
-        r'^(?=.*[A-Z].*[A-Z])(?=.*[0-9].*[0-9])[A-Za-z0-9-]{14}$',  # 14 character string with at least 2 capital letters, 2 numbers and a '-'
-        r'^(?=.*[A-Z].*[A-Z])(?=.*[0-9].*[0-9])[A-Za-z0-9-]{18}$',  # 18 character string with at least 2 capital letters, 2 numbers and a '-'
-        r'^[A-Za-z]{17}$'  # 17 character string with all letters
-    ]
-
-    detected_texts = []
-    for page in result:
-        if page is None:
-            continue
-        for line in page:
-            if line is None:
-                continue
-            text = line[1][0]
-            text = str(text)
-            for pattern in patterns:
-                if re.search(pattern, text):
-                    detected_text = text
-                    detected_texts.append(detected_text)
-                    break
-
-    if len(detected_texts) == 0:
+    chassis_no = chassis_no_rules.apply(ocr_lines(result))["Chassis Number"]
+    if chassis_no is None:
         return "Oops, no pattern match text found"
+    return chassis_no
 
-    # Assuming we need the first valid chassis number found
-    CHASSIS_NO = detected_texts[0] if detected_texts else "Oops, no pattern match text found"
-    return CHASSIS_NO
+engine_no_rules = RuleSet("crbook_engine_no", [
+    # text containing only numbers and capital letters, "-" is optional, at least 4 numbers in the text
+    Rule("engine_no", "Engine Number", r'^(?=.*\d.*\d.*\d.*\d)[A-Z0-9-]+$', matched_line, first_only=True),
+])
 
 def process_ocr_result_engine_no(result):
-    # Define regex patterns
-    patterns = [
-        r'^(?=.*\d.*\d.*\d.*\d)[A-Z0-9-]+$'  # text containing only numbers and capital letters, "-" is optional, at least 4 numbers in the text
-    ]
-
-    detected_texts = []
-    for page in result:
-        if page is None:
-            continue
-        for line in page:
-            if line is None:
-                continue
-            text = line[1][0]
-            text = str(text)
-            for pattern in patterns:
-                if re.search(pattern, text):
-                    detected_text = text
-                    detected_texts.append(detected_text)
-                    break
-
-    if len(detected_texts) == 0:
+    engine_no = engine_no_rules.apply(ocr_lines(result))["Engine Number"]
+    if engine_no is None:
         return "Oops, no pattern match text found"
+    return engine_no
 
-    # Assuming we need the first valid engine number found
-    ENGINE_NO = detected_texts[0] if detected_texts else "Oops, no pattern match text found"
-    return ENGINE_NO
+def format_cylinder_capacity(match, lines, i):
+    modified_text = lines[i].replace('A', '4').replace('Z', '7').replace('F', '8')
 
-def process_ocr_result_cylinder_capacity(result):
-    regex_pattern = r'(CC|0000|00)'  # Matches 'CC', '0000', or '00'
-    detected_texts = []
+    if '.' in modified_text:
+        modified_text = modified_text.split('.')[0] + '.00 CC'
+    elif modified_text.endswith('0000'):
+        modified_text = modified_text[:-4] + '.00 CC'
+    else:
+        modified_text += ' CC'  # Adding ' CC' if neither condition matches
+    return modified_text
 
-    for page in result:
-        if page is None:
-            continue
-        for line in page:
-            if line is None:
-                continue
-            text = line[1][0]
-            text = str(text)
-            if re.search(regex_pattern, text):
-                detected_text = text
-                detected_texts.append(detected_text)
+cylinder_capacity_rules = RuleSet("crbook_cylinder_capacity", [
+    Rule("cylinder_capacity", "Cylinder Capacity", r'(CC|0000|00)', format_cylinder_capacity, first_only=True),  # Matches 'CC', '0000', or '00'
+])
 
-    if len(detected_texts) == 0:
+def process_ocr_result_cylinder_capacity(result):
+    cylinder_capacity = cylinder_capacity_rules.apply(ocr_lines(result))["Cylinder Capacity"]
+    if cylinder_capacity is None:
         return "Oops, No pattern match text found"
+    return cylinder_capacity  # The first matching line, formatted
+
+# Target strings for fuzzy matching, scored against all OCR lines at once
+class_of_vehicle_vocabulary = Vocabulary(["MOTOR TRICYCLE", "MOTOR CYCLE", "LAND VEHICLE", "DUALPURPOSE VEHICLE"], cutoff=50)
+taxation_class_vocabulary = Vocabulary(["THREE WHEELER CAR", "MOTOR CYCLE", "LAND VEHICLE", "DUAL PURPOSE VEHICLE", "LIGHT MOTOR CYCLE", "MOTOR CAR"], cutoff=50)
+status_when_reg_vocabulary = Vocabulary(["BRAND NEW","RECONDITIONED"], cutoff=50)
+fuel_type_vocabulary = Vocabulary(["DIESEL","PETROL"], cutoff=50)
+manufacturer_vocabulary = Vocabulary(['PIAGGIO', 'HONDA', 'TOYOTA', 'SUZUKI', 'BAJAJ'], cutoff=80)
+
+# Fuzzy rules score every line against their vocabulary at once, so they take the
+# whole text (the pattern always matches) and work on its lines
+ALL_LINES = r'\A'
+
+def class_of_vehicle(match, lines, i):
+    # Find the first line matching a target string and update the text based on conditions
+    text, target = class_of_vehicle_vocabulary.first_match(lines)
+    if target is None:
+        return None
 
-    modified_texts = []
-    for text in detected_texts:
-        modified_text = text.replace('A', '4').replace('Z', '7').replace('F', '8')
-
-        if '.' in modified_text:
-            modified_text = modified_text.split('.')[0] + '.00 CC'
-        elif modified_text.endswith('0000'):
-            modified_text = modified_text[:-4] + '.00 CC'
-        else:
-            modified_text += ' CC'  # Adding ' CC' if neither condition matches
-
-        modified_texts.append(modified_text)
+    # Check if the text starts with "MOT" or the 4th and 5th letters are "OR"
+    if text.startswith("MOT") or (len(text) > 4 and text[3:5] == "OR"):
+        text = "MOTOR" + text[5:]
+
+    # Update text based on specified conditions
+    if "DUAL" in text:
+        text = "DUAL PURPOSE VEHICLE"
+    elif "LAND" in text:
+        text = "LAND VEHICLE"
+    elif "TRI" in text:
+        text = "MOTOR TRICYCLE"
+
+    # Ensure "MOTOR" is followed by a space if it is a single word
+    if "MOTOR" in text and " " not in text.split("MOTOR", 1)[1]:
+        text = text.replace("MOTOR", "MOTOR ", 1)
+
+    # Check if any word has 5 letters and ends with "CLE", replace with "CYCLE"
+    words = text.split(" ")
+    words = [word if not (len(word) == 5 and word.endswith("CLE")) else "CYCLE" for word in words]
+    return " ".join(words)
+
+def normalise_taxation_line(text):
+    # Remove any single letter after a whitespace
+    words = text.split()
+    text = ' '.join([word for word in words if len(word) > 1])
+
+    # If "MOTOR" is in the text, check the next character is a whitespace or not
+    if "MOTOR" in text:
+        motor_index = text.find("MOTOR")
+        if motor_index != -1 and motor_index + 5 < len(text):
+            next_char = text[motor_index + 5]
+            if next_char != ' ':
+                text = text[:motor_index + 5] + ' ' + text[motor_index + 5:]
+    return text
+
+def taxation_class(match, lines, i):
+    # Find the first line matching a target string and update the text based on conditions
+    text, target = taxation_class_vocabulary.first_match([normalise_taxation_line(line) for line in lines])
+    if target is None:
+        return None
 
-    # Return the first modified text found
-    CYLINDER_CAPACITY = modified_texts[0] if modified_texts else "Oops, No pattern match text found"
-    return CYLINDER_CAPACITY
+    # Update the text based on the specified conditions
+    if "DUAL" in text:
+        text = "DUAL PURPOSE VEHICLE"
+    elif "LAND" in text:
+        text = "LAND VEHICLE"
+    elif "THREE" in text:
+        text = "THREE WHEELER CAR"
+    return text
+
+def vocabulary_target(vocabulary):
+    # The target string of the first line matching the vocabulary
+    def extract(match, lines, i):
+        return vocabulary.first_match(lines)[1]
+    return extract
+
+class_of_vehicle_rules = RuleSet("crbook_class_of_vehicle", [
+    Rule("class_of_vehicle", "Class_of Vehicle", ALL_LINES, class_of_vehicle, scope="text"),
+])
+taxation_class_rules = RuleSet("crbook_taxation_class", [
+    Rule("taxation_class", "Taxation Class", ALL_LINES, taxation_class, scope="text"),
+])
+status_when_reg_rules = RuleSet("crbook_status_when_reg", [
+    Rule("status_when_reg", "Status When Registered", ALL_LINES, vocabulary_target(status_when_reg_vocabulary), scope="text"),
+])
+fuel_type_rules = RuleSet("crbook_fuel_type", [
+    Rule("fuel_type", "Fuel Type", ALL_LINES, vocabulary_target(fuel_type_vocabulary), scope="text"),
+])
 
 def process_ocr_result_class_of_vehicle(result):
-    # Define the target strings for fuzzy matching
-    target_strings = ["MOTOR TRICYCLE", "MOTOR CYCLE", "LAND VEHICLE", "DUALPURPOSE VEHICLE"]
-
-    text_list = []
-    for page in result:
-        if page is None:
-            continue
-        for line in page:
-            if line is None:
-                continue
-            text = line[1][0]
-            text = str(text)
-            text_list.append(text)
-
-    # Find target strings using fuzzy matching and update the text based on conditions
-    for text in text_list:
-        for target in target_strings:
-            if fuzz.ratio(target, text) > 50:  # adjust the threshold as needed
-                # Check if the text starts with "MOT" or the 4th and 5th letters are "OR"
-                if text.startswith("MOT") or (len(text) > 4 and text[3:5] == "OR"):
-                    text = "MOTOR" + text[5:]
-
-                # Update text based on specified conditions
-                if "DUAL" in text:
-                    text = "DUAL PURPOSE VEHICLE"
-                elif "LAND" in text:
-                    text = "LAND VEHICLE"
-                elif "TRI" in text:
-                    text = "MOTOR TRICYCLE"
-
-                # Ensure "MOTOR" is followed by a space if it is a single word
-                if "MOTOR" in text and " " not in text.split("MOTOR", 1)[1]:
-                    text = text.replace("MOTOR", "MOTOR ", 1)
-
-                # Check if any word has 5 letters and ends with "CLE", replace with "CYCLE"
-                words = text.split(" ")
-                words = [word if not (len(word) == 5 and word.endswith("CLE")) else "CYCLE" for word in words]
-                text = " ".join(words)
-
-                return text  # Return the text once a match is found
-
-    return "Oops, no pattern match text found"
+    text = class_of_vehicle_rules.apply(ocr_lines(result))["Class_of Vehicle"]
+    if text is None:
+        return "Oops, no pattern match text found"
+    return text
 
 def process_ocr_result_taxation_class(result):
-    # Define the target strings for fuzzy matching
-    target_strings = ["THREE WHEELER CAR", "MOTOR CYCLE", "LAND VEHICLE", "DUAL PURPOSE VEHICLE", "LIGHT MOTOR CYCLE", "MOTOR CAR"]
-
-    text_list = []
-    for page in result:
-        if page is None:
-            continue
-        for line in page:
-            if line is None:
-                continue
-            text = line[1][0]
-            text = str(text)
-
-            # Remove any single letter after a whitespace
-            words = text.split()
-            text = ' '.join([word for word in words if len(word) > 1])
-
-            # If "MOTOR" is in the text, check the next character is a whitespace or not
-            if "MOTOR" in text:
-                motor_index = text.find("MOTOR")
-                if motor_index != -1 and motor_index + 5 < len(text):
-                    next_char = text[motor_index + 5]
-                    if next_char != ' ':
-                        text = text[:motor_index + 5] + ' ' + text[motor_index + 5:]
-
-            text_list.append(text)
-
-    # Find target strings using fuzzy matching and update the text based on conditions
-    for text in text_list:
-        for target in target_strings:
-            if fuzz.ratio(target, text) > 50:  # adjust the threshold as needed
-
-                # Update the text based on the specified conditions
-                if "DUAL" in text:
-                    text = "DUAL PURPOSE VEHICLE"
-                elif "LAND" in text:
-                    text = "LAND VEHICLE"
-                elif "THREE" in text:
-                    text = "THREE WHEELER CAR"
-
-                return text  # Return the text once a match is found
-
-    return "Oops, no pattern match text found"
+    text = taxation_class_rules.apply(ocr_lines(result))["Taxation Class"]
+    if text is None:
+        return "Oops, no pattern match text found"
+    return text
 
 def process_ocr_result_status_when_reg(result):
-    # Define the target strings for fuzzy matching
-    target_strings = ["BRAND NEW","RECONDITIONED"]
-
-    text_list = []
-    for page in result:
-        if page is None:
-            continue
-        for line in page:
-            if line is None:
-                continue
-            text = line[1][0]
-            text = str(text)
-            text_list.append(text)
-
-    # Find target strings using fuzzy matching and update the text based on conditions
-    for text in text_list:
-        for target in target_strings:
-            if fuzz.ratio(target, text) > 50:  # adjust the threshold as needed
-                #print("STATUS WHEN REGISTERED:", target)
-                return target  # Return the target string once a match is found
-
-    return "Oops, no pattern match text found"
+    target = status_when_reg_rules.apply(ocr_lines(result))["Status When Registered"]
+    if target is None:
+        return "Oops, no pattern match text found"
+    return target
 
 def process_ocr_result_fuel_type(result):
-    # Define the target strings for fuzzy matching
-    target_strings = ["DIESEL","PETROL"]
-
-    text_list = []
-    for page in result:
-        if page is None:
-            continue
-        for line in page:
-            if line is None:
-                continue
-            text = line[1][0]
-            text = str(text)
-            text_list.append(text)
+    target = fuel_type_rules.apply(ocr_lines(result))["Fuel Type"]
+    if target is None:
+        return "Oops, no pattern match text found"
+    return target
 
-    # Find target strings using fuzzy matching and update the text based on conditions
-    for text in text_list:
-        for target in target_strings:
-            if fuzz.ratio(target, text) > 50:  # adjust the threshold as needed
-                #print("FUEL TYPE:", target)
-                return target  # Return the target string once a match is found
+def first_group(match, lines, i):
+    return match.group(1)
 
-    return "Oops, no pattern match text found"
+cr_number_rules = RuleSet("crbook_cr_number", [
+    Rule("cr_number", "cr_number", r'(?:CR|LO[T])\s*(?:No\.?|NUMBER)?\s*:?\s*(?:LOT\s*[F]\s*[M])?\s*(\d{7})', first_group, flags=re.IGNORECASE, first_only=True),
+])
 
 def process_ocr_result_cr_number(result):
-    regex_pattern = r'(?:CR|LO[T])\s*(?:No\.?|NUMBER)?\s*:?\s*(?:LOT\s*[F]\s*[M])?\s*(\d{7})'
-    
-    for page in result:
-        if page is None:
-            continue
-        for line in page:
-            if line is None:
-                continue
-            text = line[1][0]
-            text = str(text)
-            match = re.search(regex_pattern, text, re.IGNORECASE)
-            if match:
-                return match.group(1)
-    return "Oops, no pattern match text found"
+    cr_number = cr_number_rules.apply(ocr_lines(result))["cr_number"]
+    if cr_number is None:
+        return "Oops, no pattern match text found"
+    return cr_number
 
 def process_ocr_result_owner_details(result):
     owner_info = []
@@ -569,6 +635,8 @@ def process_ocr_result_owner_details(result):
         "address": owner_info[1] if len(owner_info) > 1 else None
     }
 
+MODEL_PATTERN = re.compile(r'^[A-Z0-9-]+$')
+
 def process_ocr_result_make_model(result):
     make = None
     model = None
@@ -576,109 +644,76 @@ def process_ocr_result_make_model(result):
     for page in result:
         if page is None:
             continue
-        for line in page:
-            if line is None:
-                continue
-            text = line[1][0]
-            text = str(text).strip().upper()
-            
-            # Common vehicle manufacturers
-            manufacturers = ['PIAGGIO', 'HONDA', 'TOYOTA', 'SUZUKI', 'BAJAJ']
-            
-            for manufacturer in manufacturers:
-                if fuzz.ratio(manufacturer, text) > 80:
-                    make = manufacturer
-                    break
+        text_list = [str(line[1][0]).strip().upper() for line in page if line is not None]
+        
+        # Common vehicle manufacturers, matched against every line of the page in one batch
+        for text, manufacturer in zip(text_list, manufacturer_vocabulary.first_matches(text_list)):
+            if manufacturer is not None:
+                make = manufacturer
             
             # If text isn't the make and looks like a model (alphanumeric)
-            if make and re.match(r'^[A-Z0-9-]+$', text) and text != make:
+            if make and MODEL_PATTERN.match(text) and text != make:
                 model = text
                 break
     
     return {"make": make, "model": model}
 
+# Regular expressions for different date formats
+DATE_PATTERNS = [re.compile(pattern) for pattern in [
+    r'(\d{2}/\d{2}/\d{4})',  # DD/MM/YYYY
+    r'(\d{4}-\d{2}-\d{2})',  # YYYY-MM-DD
+    r'(\d{2}-\d{2}-\d{4})'   # DD-MM-YYYY
+]]
+
+def line_date(label):
+    # The date on a line mentioning the label, the last format matching wins
+    def extract(match, lines, i):
+        if label not in lines[i].upper():
+            return None
+        date = None
+        for pattern in DATE_PATTERNS:
+            date_match = pattern.search(lines[i])
+            if date_match:
+                date = date_match.group(1)
+        return date
+    return extract
+
+date_rules = RuleSet("crbook_dates", [
+    Rule("registration_date", "registration_date", "|".join(pattern.pattern for pattern in DATE_PATTERNS), line_date('REGISTRATION')),
+    Rule("printed_date", "printed_date", "|".join(pattern.pattern for pattern in DATE_PATTERNS), line_date('PRINTED')),
+])
+
 def process_ocr_result_dates(result):
-    # Regular expressions for different date formats
-    date_patterns = [
-        r'(\d{2}/\d{2}/\d{4})',  # DD/MM/YYYY
-        r'(\d{4}-\d{2}-\d{2})',  # YYYY-MM-DD
-        r'(\d{2}-\d{2}-\d{4})'   # DD-MM-YYYY
-    ]
-    
-    dates = {}
-    for page in result:
-        if page is None:
-            continue
-        for line in page:
-            if line is None:
-                continue
-            text = line[1][0]
-            text = str(text)
-            
-            # Check for registration date
-            if 'REGISTRATION' in text.upper():
-                for pattern in date_patterns:
-                    match = re.search(pattern, text)
-                    if match:
-                        dates['registration_date'] = match.group(1)
-                        
-            # Check for printed date
-            if 'PRINTED' in text.upper():
-                for pattern in date_patterns:
-                    match = re.search(pattern, text)
-                    if match:
-                        dates['printed_date'] = match.group(1)
-    
-    return dates
+    # The last line with each date wins
+    return {field: date for field, date in date_rules.apply(ocr_lines(result)).items() if date is not None}
+
+def first_group_number(match, lines, i):
+    return float(match.group(1))
+
+weight_rules = RuleSet("crbook_weights", [
+    Rule("unladen", "unladen", r'UNLADEN[:\s]*(\d+(?:\.\d+)?)\s*KG', first_group_number),
+    Rule("gross", "gross", r'GROSS[:\s]*(\d+(?:\.\d+)?)\s*KG', first_group_number),
+])
 
 def process_ocr_result_weights(result):
-    weights = {}
-    
-    for page in result:
-        if page is None:
-            continue
-        for line in page:
-            if line is None:
-                continue
-            text = line[1][0]
-            text = str(text).upper()
-            
-            # Look for weight specifications
-            unladen_match = re.search(r'UNLADEN[:\s]*(\d+(?:\.\d+)?)\s*KG', text)
-            gross_match = re.search(r'GROSS[:\s]*(\d+(?:\.\d+)?)\s*KG', text)
-            
-            if unladen_match:
-                weights['unladen'] = float(unladen_match.group(1))
-            if gross_match:
-                weights['gross'] = float(gross_match.group(1))
-    
-    return weights
+    # Look for weight specifications, the last line with each wins
+    weights = weight_rules.apply(ocr_lines(result).upper())
+    return {field: weight for field, weight in weights.items() if weight is not None}
+
+dimension_rules = RuleSet("crbook_dimensions", [
+    Rule("length", "length", r'LENGTH[:\s]*(\d+(?:\.\d+)?)\s*(?:CM|MM)', first_group_number, flags=re.IGNORECASE),
+    Rule("width", "width", r'WIDTH[:\s]*(\d+(?:\.\d+)?)\s*(?:CM|MM)', first_group_number, flags=re.IGNORECASE),
+    Rule("height", "height", r'HEIGHT[:\s]*(\d+(?:\.\d+)?)\s*(?:CM|MM)', first_group_number, flags=re.IGNORECASE),
+])
 
 def process_ocr_result_dimensions(result):
-    dimensions = {}
-    
-    for page in result:
-        if page is None:
-            continue
-        for line in page:
-            if line is None:
-                continue
-            text = line[1][0]
-            text = str(text)
-            
-            # Look for dimension specifications
-            length_match = re.search(r'LENGTH[:\s]*(\d+(?:\.\d+)?)\s*(?:CM|MM)', text, re.IGNORECASE)
-            width_match = re.search(r'WIDTH[:\s]*(\d+(?:\.\d+)?)\s*(?:CM|MM)', text, re.IGNORECASE)
-            height_match = re.search(r'HEIGHT[:\s]*(\d+(?:\.\d+)?)\s*(?:CM|MM)', text, re.IGNORECASE)
-            
-            if length_match:
-                dimensions['length'] = float(length_match.group(1))
-            if width_match:
-                dimensions['width'] = float(width_match.group(1))
-            if height_match:
-                dimensions['height'] = float(height_match.group(1))
-    
-    return dimensions
+    # Look for dimension specifications, the last line with each wins
+    dimensions = dimension_rules.apply(ocr_lines(result))
+    return {field: value for field, value in dimensions.items() if value is not None}
+
+TRANSFER_DATE_PATTERN = re.compile(r'TRANSFERRED\s+DATE\s*[:]\s*(\d{2}/\d{2}/\d{4})', re.IGNORECASE)
+# Any of these marks a line as part of an address
+ADDRESS_PATTERN = re.compile(r'NO\.?\s*\d+|ROAD|STREET|COLOMBO|LANE', re.IGNORECASE)
 
 def process_ocr_result_previous_owners(result):
     previous_owners = []
@@ -694,7 +729,7 @@ def process_ocr_result_previous_owners(result):
             text = str(text)
             
             # Look for transfer date
-            transfer_match = re.search(r'TRANSFERRED\s+DATE\s*[:]\s*(\d{2}/\d{2}/\d{4})', text, re.IGNORECASE)
+            transfer_match = TRANSFER_DATE_PATTERN.search(text)
             if transfer_match:
                 if current_owner:
                     current_owner['transfer_date'] = transfer_match.group(1)
@@ -703,15 +738,7 @@ def process_ocr_result_previous_owners(result):
                 continue
             
             # Look for address patterns
-            address_patterns = [
-                r'NO\.?\s*\d+',
-                r'ROAD',
-                r'STREET',
-                r'COLOMBO',
-                r'LANE'
-            ]
-            
-            is_address = any(re.search(pattern, text, re.IGNORECASE) for pattern in address_patterns)
+            is_address = ADDRESS_PATTERN.search(text) is not None
             
             if is_address:
                 if 'address' not in current_owner:
@@ -744,12 +771,14 @@ def process_ocr_cr_book(uploaded_image):
     global processed_results
     
     if uploaded_image:
-        # Save image temporarily
-        with open('temp_image.jpg', 'wb') as f:
-            f.write(uploaded_image)
+        # Decode once; every stage works on this in-memory page
+        page = PageImage(uploaded_image)
+        
+        if CRBOOK_OCR_MODE == "single_pass":
+            return process_ocr_cr_book_single_pass(uploaded_image, page)
         
         # Validate if the image is a CR book image
-        is_cr_book = validate_cr_book_image('temp_image.jpg')
+        is_cr_book = validate_cr_book_image(page.bgr)
         
         if not is_cr_book:
             # If not a CR book image, return None for all fields
@@ -762,13 +791,13 @@ def process_ocr_cr_book(uploaded_image):
             return {"image_data": image_data, "extracted_info": results}
         
         # If it is a CR book image, proceed with outline detection and OCR
-        cropped_image = outline_detection_pipeline('temp_image.jpg')
+        cropped_image = outline_detection_pipeline(page)
         
-        # Process each field
+        # Process each field; the field crops are OCR'd concurrently
+        field_results = perform_ocr_on_fields(cropped_image)
         results = {}
         for field, (coords, threshold, processor) in field_params.items():
-            result = perform_ocr_on_cropped_image(cropped_image, coords, threshold)
-            results[field] = processor(result)
+            results[field] = processor(field_results[field])
         
         processed_results = results
         
@@ -777,26 +806,36 @@ def process_ocr_cr_book(uploaded_image):
         
         return {"image_data": image_data, "extracted_info": results}
 
-def validate_cr_book_image(image_path):
+def process_ocr_cr_book_single_pass(uploaded_image, page):
+    """Extract the fields and validate the CR book from a single detection pass"""
+    global processed_results
+    
+    try:
+        cropped_image = outline_detection_pipeline(page)
+    except Exception:
+        # No outline found (usually not a CR book); the keyword check decides
+        cropped_image = Image.fromarray(page.rgb)
+    
+    field_results, texts = single_pass_ocr(cropped_image)
+    
+    if contains_cr_book_keywords(texts):
+        results = {field: processor(field_results[field]) for field, (_, _, processor) in field_params.items()}
+    else:
+        # If not a CR book image, return None for all fields
+        results = {field: None for field in field_params.keys()}
+    
+    processed_results = results
+    
+    # Convert image for display
+    image_data = base64.b64encode(uploaded_image).decode('utf-8')
+    
+    return {"image_data": image_data, "extracted_info": results}
+
+def validate_cr_book_image(image):
     """Validate if the image is a CR book image by checking for specific text or patterns"""
     # Perform OCR on the entire image to check for CR book-specific keywords
-    ocr = PaddleOCR(lang='en', use_gpu=False)
-    result = ocr.ocr(image_path, cls=True)
-    
-    # Define a list of keywords that are typically found in CR book images
-    cr_book_keywords = ["REGISTRATION", "CHASSIS", "ENGINE", "CYLINDER", "VEHICLE", "TAXATION", "STATUS", "FUEL"]
+    result = run_ocr(image, cls=True)
     
     # Check if any of the keywords are present in the OCR result
-    for page in result:
-        if page is None:
-            continue
-        for line in page:
-            if line is None:
-                continue
-            text = line[1][0]
-            text = str(text).upper()
-            for keyword in cr_book_keywords:
-                if keyword in text:
-                    return True  # If any keyword is found, assume it's a CR book image
-    
-    return False  # If no keywords are found, assume it's not a CR book image
\ No newline at end of file
+    texts = [line[1][0] for page in result if page is not None for line in page if line is not None]
+    return contains_cr_book_keywords(texts)
\ No newline at end of file
@@ -0,0 +1,117 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+logger = logging.getLogger(__name__)
+logging.getLogger('ppocr').setLevel(logging.ERROR)
+
+OCR_LANG = os.getenv("OCR_LANG", "en")
+OCR_USE_GPU = os.getenv("OCR_USE_GPU", "false").lower() in ("1", "true", "yes")
+
+# One PaddleOCR instance per configuration, shared by every OCR module. Loading
+# the detection/recognition weights takes seconds, so it happens once per process.
+_engines = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+# Workers for running independent OCR calls (e.g. CR book field crops) in parallel.
+# The pool is shared by all requests, so concurrent documents never run more than
+# this many OCR calls at once; each worker thread loads its own engine.
+OCR_PARALLEL_WORKERS = int(os.getenv("OCR_PARALLEL_WORKERS", 4))
+ocr_pool = ThreadPoolExecutor(max_workers=max(1, OCR_PARALLEL_WORKERS), thread_name_prefix="ocr")
+_thread_engines = threading.local()
+
+
+def _engine_key(lang, use_gpu, options):
+    return (lang, use_gpu, tuple(sorted(options.items())))
+
+
+def get_engine(lang: str = OCR_LANG, use_gpu: bool = OCR_USE_GPU, **options):
+    """Return the shared PaddleOCR engine for this configuration, loading it on first use"""
+    key = _engine_key(lang, use_gpu, options)
+    engine = _engines.get(key)
+    if engine is not None:
+        return engine
+    with _registry_lock:
+        if key not in _engines:
+            from paddleocr import PaddleOCR
+            started = time.perf_counter()
+            _engines[key] = PaddleOCR(lang=lang, use_gpu=use_gpu, **options)
+            _locks[key] = threading.Lock()
+            logger.info(f"Loaded PaddleOCR engine {key} in {time.perf_counter() - started:.2f}s")
+        return _engines[key]
+
+
+def get_thread_engine(lang: str = OCR_LANG, use_gpu: bool = OCR_USE_GPU, **options):
+    """Return an engine owned by the calling thread, so pool workers never contend for one"""
+    engines = getattr(_thread_engines, "engines", None)
+    if engines is None:
+        engines = _thread_engines.engines = {}
+    key = _engine_key(lang, use_gpu, options)
+    if key not in engines:
+        from paddleocr import PaddleOCR
+        started = time.perf_counter()
+        engines[key] = PaddleOCR(lang=lang, use_gpu=use_gpu, **options)
+        logger.info(f"Loaded PaddleOCR engine {key} for {threading.current_thread().name} in {time.perf_counter() - started:.2f}s")
+    return engines[key]
+
+
+def run_ocr(image, lang: str = OCR_LANG, use_gpu: bool = OCR_USE_GPU, engine_options=None, **kwargs):
+    """
+    Run OCR on an image (array, bytes or path) with the shared engine. Paddle
+    predictors are not safe to call from several threads at once, so calls on
+    the same engine are serialised.
+    """
+    engine_options = engine_options or {}
+    engine = get_engine(lang, use_gpu, **engine_options)
+    with _locks[_engine_key(lang, use_gpu, engine_options)]:
+        return engine.ocr(image, **kwargs)
+
+
+def warm_up(lang: str = OCR_LANG, use_gpu: bool = OCR_USE_GPU):
+    """Load the default engine and run one tiny inference so the first request is not slow"""
+    started = time.perf_counter()
+    run_ocr(np.full((32, 128, 3), 255, dtype=np.uint8), lang=lang, use_gpu=use_gpu)
+    logger.info(f"OCR engine warmed up in {time.perf_counter() - started:.2f}s")
+
+
+def detect_text(image, **kwargs) -> list:
+    """Run text detection only and return the boxes, four [x, y] points each"""
+    result = run_ocr(image, det=True, rec=False, cls=False, **kwargs)
+    return (result[0] or []) if result else []
+
+
+def recognize_text(crops, cls=False, **kwargs) -> list:
+    """Recognise a batch of text crops in one call, returning (text, score) per crop"""
+    if not crops:
+        return []
+    result = run_ocr(list(crops), det=False, rec=True, cls=cls, **kwargs)
+    return result[0] if result else []
+
+
+def use_shared_engine():
+    """
+    Make run_ocr_parallel take turns on the shared engine instead of loading one
+    engine per pool thread. OCR worker processes call this on start: the processes
+    are already the parallelism and each holds one warmed engine.
+    """
+    global OCR_PARALLEL_WORKERS
+    OCR_PARALLEL_WORKERS = 1
+
+
+def run_ocr_parallel(images, lang: str = OCR_LANG, use_gpu: bool = OCR_USE_GPU, engine_options=None, **kwargs) -> list:
+    """
+    Run OCR on several images concurrently on the shared pool and return the
+    results in input order. With a single worker the shared engine is used in turn.
+    """
+    engine_options = engine_options or {}
+    if OCR_PARALLEL_WORKERS <= 1:
+        return [run_ocr(image, lang, use_gpu, engine_options, **kwargs) for image in images]
+
+    def ocr_one(image):
+        return get_thread_engine(lang, use_gpu, **engine_options).ocr(image, **kwargs)
+
+    return list(ocr_pool.map(ocr_one, images))
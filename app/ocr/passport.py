@@ -1,22 +1,21 @@
-from paddleocr import PaddleOCR
 from PIL import Image
 import numpy as np
+import csv
 import logging
+from functools import lru_cache
 from io import BytesIO
 from passporteye import read_mrz
-import pandas as pd
 import base64
+from app.ocr.engine import run_ocr
 
-# Initialize logging and PaddleOCR
-logging.getLogger('ppocr').setLevel(logging.ERROR)
-ocr = PaddleOCR(lang='en')
-
-# Load country data
-try:
-    country_df = pd.read_csv('countries.csv')
-    country_dict = dict(zip(country_df['ISO Code'], country_df['Country']))
-except:
-    country_dict = {}  # Fallback if CSV not found
+@lru_cache(maxsize=1)
+def country_names() -> dict:
+    """ISO code to country name from countries.csv, read on first use"""
+    try:
+        with open('countries.csv', newline='', encoding='utf-8') as f:
+            return {row['ISO Code']: row['Country'] for row in csv.DictReader(f)}
+    except (OSError, KeyError, csv.Error):
+        return {}  # Fallback if CSV not found
 
 def extract_passport_info(image_bytes):
     """
@@ -30,7 +29,7 @@ def extract_passport_info(image_bytes):
     
     # Extract additional text using PaddleOCR
     image_array = np.array(image)
-    result = ocr.ocr(image_array, rec=True)
+    result = run_ocr(image_array, rec=True)
     ocr_text = " ".join([line[1][0] for line in result[0]])
     
     # Combine and return all extracted data
@@ -63,7 +62,7 @@ def extract_mrz_data(image_stream):
             "Surname": mrz_data.get('surname', '').replace('<', ' ').strip() or None,
             "Nic Number": mrz_data.get('personal_number', '').replace('<', '') or None,
             "Passport Number": mrz_data.get('number', '').replace('<', '') or None,
-            "Country": country_dict.get(mrz_data.get('nationality', '').replace('<', ''), None),
+            "Country": country_names().get(mrz_data.get('nationality', '').replace('<', ''), None),
             "Sex": 'Female' if mrz_data.get('sex', '') == 'F' else 'Male' if mrz_data.get('sex', '') == 'M' else None,
             "Type": mrz_data.get('type', '') or None,
             "MRZ Code": mrz_data.get('raw_text', '') or None,
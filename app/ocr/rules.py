@@ -0,0 +1,81 @@
+import re
+import threading
+import time
+
+_stats_lock = threading.Lock()
+rule_stats = {}
+
+
+def matched_text(match, lines, index):
+    return match.group()
+
+
+class Rule:
+    """
+    One field extraction rule. The pattern is compiled once at import and
+    `extract(match, lines, index)` turns a match into the field value. Line rules
+    are tried on every OCR line, text rules once on the whole text. With
+    first_only the first matching line wins, otherwise later matches overwrite it.
+    An extract returning None rejects the match, as if the pattern had not matched.
+    """
+
+    def __init__(self, name, field, pattern, extract=matched_text, flags=0, first_only=False, scope="line"):
+        self.name = name
+        self.field = field
+        self.pattern = re.compile(pattern, flags)
+        self.extract = extract
+        self.first_only = first_only
+        self.scope = scope
+
+
+class RuleSet:
+    """
+    A group of rules applied to OCR text in a single pass: each line is handed to
+    every rule still interested in it, and the time spent per rule is counted.
+    """
+
+    def __init__(self, name, rules):
+        self.name = name
+        self.rules = rules
+        self.fields = list(dict.fromkeys(rule.field for rule in rules))
+
+    def apply(self, text) -> dict:
+        """Run every rule over the text and return {field: value}, None where nothing matched"""
+        info = dict.fromkeys(self.fields)
+        lines = text.split("\n")
+        seconds = dict.fromkeys((rule.name for rule in self.rules), 0.0)
+        matches = dict.fromkeys(seconds, 0)
+
+        for rule in self.rules:
+            if rule.scope != "text":
+                continue
+            started = time.perf_counter()
+            match = rule.pattern.search(text)
+            value = rule.extract(match, lines, None) if match else None
+            if value is not None:
+                info[rule.field] = value
+                matches[rule.name] += 1
+            seconds[rule.name] += time.perf_counter() - started
+
+        pending = [rule for rule in self.rules if rule.scope == "line"]
+        for index, line in enumerate(lines):
+            if not pending:
+                break
+            for rule in list(pending):
+                started = time.perf_counter()
+                match = rule.pattern.search(line)
+                value = rule.extract(match, lines, index) if match else None
+                if value is not None:
+                    info[rule.field] = value
+                    matches[rule.name] += 1
+                    if rule.first_only:
+                        pending.remove(rule)
+                seconds[rule.name] += time.perf_counter() - started
+
+        with _stats_lock:
+            for name, elapsed in seconds.items():
+                stats = rule_stats.setdefault(f"{self.name}.{name}", {"runs": 0, "matches": 0, "seconds": 0.0})
+                stats["runs"] += 1
+                stats["matches"] += matches[name]
+                stats["seconds"] += elapsed
+        return info
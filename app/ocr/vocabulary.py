@@ -0,0 +1,55 @@
+import numpy as np
+
+try:
+    from rapidfuzz import fuzz
+    from rapidfuzz.process import cdist
+except ImportError:  # Fall back to scoring pair by pair with fuzzywuzzy
+    from fuzzywuzzy import fuzz
+    cdist = None
+
+
+class Vocabulary:
+    """
+    A fixed list of target strings matched against OCR lines with fuzz.ratio.
+    Every line is scored against every target in one batch; lines whose length
+    rules out reaching the cutoff against any target are skipped before scoring.
+    Scores are rounded like fuzzywuzzy's, so `score > cutoff` decides as before.
+    """
+
+    def __init__(self, targets, cutoff):
+        self.targets = list(targets)
+        self.cutoff = cutoff
+        # ratio <= 200 * min(len1, len2) / (len1 + len2) whatever the characters, so
+        # only texts with a length strictly inside this range can pass against some target
+        lengths = [len(target) for target in self.targets]
+        self._min_length = min(lengths) * cutoff / (200 - cutoff)
+        self._max_length = max(lengths) * (200 - cutoff) / cutoff if cutoff else float("inf")
+
+    def scores(self, texts) -> np.ndarray:
+        """Rounded fuzz.ratio of every text against every target (0 where pruned)"""
+        scores = np.zeros((len(texts), len(self.targets)))
+        if not texts:
+            return scores
+        if cdist is None:
+            for row, text in enumerate(texts):
+                scores[row] = [fuzz.ratio(target, text) for target in self.targets]
+            return scores
+
+        candidates = [row for row, text in enumerate(texts) if self._min_length < len(text) < self._max_length]
+        if candidates:
+            selected = [texts[row] for row in candidates]
+            scores[candidates] = cdist(selected, self.targets, scorer=fuzz.ratio, score_cutoff=self.cutoff)
+        return np.rint(scores)
+
+    def first_matches(self, texts) -> list:
+        """For each text, the first target scoring above the cutoff, or None"""
+        passed = self.scores(texts) > self.cutoff
+        first = passed.argmax(axis=1)
+        return [self.targets[index] if row.any() else None for index, row in zip(first, passed)]
+
+    def first_match(self, texts):
+        """The first text matching any target and its first matching target, or (None, None)"""
+        for text, target in zip(texts, self.first_matches(texts)):
+            if target is not None:
+                return text, target
+        return None, None
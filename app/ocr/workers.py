@@ -0,0 +1,199 @@
+import asyncio
+import importlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from app.services.executor import run_blocking
+
+logger = logging.getLogger(__name__)
+
+# Local OCR entry points per document type, imported inside the worker that runs them
+PROCESSORS = {
+    "crbook": ("app.ocr.crbook", "process_ocr_cr_book"),
+    "licence": ("app.ocr.drlicence", "process_ocr_licence"),
+    "passport": ("app.ocr.passport", "process_ocr_passport"),
+}
+
+OCR_BACKEND = os.getenv("OCR_BACKEND", "thread")
+OCR_PROCESS_WORKERS = int(os.getenv("OCR_PROCESS_WORKERS", 2))
+OCR_MAX_TASKS_PER_CHILD = int(os.getenv("OCR_MAX_TASKS_PER_CHILD", 50))
+OCR_MAX_PENDING = int(os.getenv("OCR_MAX_PENDING", OCR_PROCESS_WORKERS * 4))
+OCR_QUEUE_TIMEOUT = float(os.getenv("OCR_QUEUE_TIMEOUT", 10))
+
+
+class OCRQueueFull(RuntimeError):
+    """Raised when every OCR slot stays busy for longer than the queue timeout"""
+
+
+def _init_worker():
+    """Load the OCR engine once when a worker process starts; it is the only one the process uses"""
+    from app.ocr.engine import use_shared_engine, warm_up
+    use_shared_engine()
+    warm_up()
+
+
+def _run_processor(doc_type, content):
+    module, name = PROCESSORS[doc_type]
+    result = getattr(importlib.import_module(module), name)(content)
+    # Previews are served from the upload store, so don't ship the base64 image back
+    if isinstance(result, dict):
+        result.pop("image_data", None)
+    return result
+
+
+def _process_job(doc_type, segment, size):
+    """Worker side of a job: read the upload from shared memory and run the OCR pipeline"""
+    started = time.perf_counter()
+    shm = shared_memory.SharedMemory(name=segment)
+    try:
+        content = bytes(shm.buf[:size])
+    finally:
+        shm.close()
+    result = _run_processor(doc_type, content)
+    return result, os.getpid(), time.perf_counter() - started
+
+
+class OCRService:
+    """
+    Runs the local PaddleOCR pipelines away from the event loop. The `process`
+    backend hands uploads to a pool of worker processes through shared memory, so
+    inference never holds the web worker's GIL; each worker loads the engine once
+    and is replaced after `max_tasks_per_child` jobs to cap memory growth. The
+    `thread` backend runs jobs on the model thread pool inside this process.
+    At most `max_pending` jobs are admitted at once; callers wait up to
+    `queue_timeout` seconds for a slot before OCRQueueFull is raised.
+    """
+
+    def __init__(self, backend=OCR_BACKEND, workers=OCR_PROCESS_WORKERS, max_tasks_per_child=OCR_MAX_TASKS_PER_CHILD,
+                 max_pending=OCR_MAX_PENDING, queue_timeout=OCR_QUEUE_TIMEOUT):
+        if backend not in ("thread", "process"):
+            raise ValueError(f"Unknown OCR_BACKEND: {backend}")
+        self.backend = backend
+        self.workers = workers
+        self.max_tasks_per_child = max_tasks_per_child
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self._pool = None
+        self._slots = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._worker_stats = {}
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "restarts": 0, "queue_wait_seconds": 0.0}
+
+    def start(self):
+        """Create the worker pool; the workers load their engines in the background"""
+        self._slots = asyncio.Semaphore(self.max_pending)
+        if self.backend == "process":
+            self._pool = self._create_pool()
+            logger.info(f"OCR worker pool started with {self.workers} processes, recycled every {self.max_tasks_per_child} jobs")
+
+    def _create_pool(self):
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            # Paddle is not fork safe, and recycling workers requires spawn anyway
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            max_tasks_per_child=self.max_tasks_per_child
+        )
+
+    def stop(self):
+        """Stop accepting jobs and wait for the running ones"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    async def run(self, doc_type: str, content: bytes) -> dict:
+        """Run the local OCR pipeline for a document type and return its result"""
+        if doc_type not in PROCESSORS:
+            raise ValueError(f"Local OCR is not available for {doc_type}")
+        if self._slots is None:
+            self.start()
+
+        queued = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._count("rejected")
+            raise OCRQueueFull(f"OCR workers are busy ({self.max_pending} jobs in flight), try again shortly")
+        self._count("submitted", queue_wait_seconds=time.perf_counter() - queued)
+
+        try:
+            with self._lock:
+                self._pending += 1
+            if self.backend == "process":
+                result, worker, seconds = await self._run_in_process(doc_type, content)
+            else:
+                started = time.perf_counter()
+                result = await run_blocking(_run_processor, doc_type, content)
+                worker, seconds = "thread", time.perf_counter() - started
+        except Exception:
+            self._count("failed")
+            raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+            self._slots.release()
+
+        self._count("completed")
+        self._record_worker(worker, seconds)
+        return result
+
+    async def _run_in_process(self, doc_type, content):
+        # Copy the upload into a shared memory segment once instead of pickling it
+        # through the pool's call queue; the worker reads it by name
+        shm = shared_memory.SharedMemory(create=True, size=max(len(content), 1))
+        try:
+            shm.buf[:len(content)] = content
+            pool = self._pool
+            future = pool.submit(_process_job, doc_type, shm.name, len(content))
+            try:
+                return await asyncio.wrap_future(future)
+            except BrokenProcessPool:
+                # A worker died (e.g. out of memory); replace the pool so later jobs still run
+                logger.error(f"OCR worker pool broke while processing {doc_type}, restarting it")
+                with self._lock:
+                    if self._pool is pool:
+                        self._pool = self._create_pool()
+                        self._stats["restarts"] += 1
+                raise
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def _count(self, key, queue_wait_seconds=0.0):
+        with self._lock:
+            self._stats[key] += 1
+            self._stats["queue_wait_seconds"] += queue_wait_seconds
+
+    def _record_worker(self, worker, seconds):
+        now = time.time()
+        with self._lock:
+            stats = self._worker_stats.setdefault(worker, {"jobs": 0, "busy_seconds": 0.0, "first_job": now, "last_job": now})
+            stats["jobs"] += 1
+            stats["busy_seconds"] += seconds
+            stats["last_job"] = now
+
+    def snapshot(self) -> dict:
+        """Return job counters and per-worker throughput and latency"""
+        with self._lock:
+            workers = {}
+            for worker, stats in self._worker_stats.items():
+                elapsed = stats["last_job"] - stats["first_job"]
+                workers[str(worker)] = {
+                    "jobs": stats["jobs"],
+                    "busy_seconds": round(stats["busy_seconds"], 3),
+                    "avg_latency_seconds": round(stats["busy_seconds"] / stats["jobs"], 3),
+                    "jobs_per_minute": round(60 * (stats["jobs"] - 1) / elapsed, 2) if elapsed > 0 else None,
+                }
+            return {
+                "backend": self.backend,
+                "pending": self._pending,
+                **self._stats,
+                "queue_wait_seconds": round(self._stats["queue_wait_seconds"], 3),
+                "workers": workers,
+            }
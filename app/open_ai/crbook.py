@@ -7,6 +7,7 @@ import os
 import json
 import base64
 import re
+from app.services.resilience import openai_calls
 
 load_dotenv()
 
@@ -44,8 +45,8 @@ class CRBookInfo(BaseModel):
     printed_date: Optional[date] = Field(None, description="Date printed in YYYY-MM-DD format")
 
 def setup_openai(api_key: str):
-    """Initialize OpenAI client with API key"""
-    return openai.OpenAI(api_key=api_key)
+    """Initialize OpenAI client with API key (retries are left to the call policy)"""
+    return openai.OpenAI(api_key=api_key, max_retries=0)
 
 def extract_crbook_info(uploaded_image) -> CRBookInfo:
     """
@@ -116,8 +117,8 @@ def extract_crbook_info(uploaded_image) -> CRBookInfo:
     Ensure the response is valid JSON format.
     """
     
-    # Generate response using OpenAI GPT-4 Vision
-    response = client.chat.completions.create(
+    # Generate response using OpenAI GPT-4 Vision, under the shared OpenAI call policy
+    response = openai_calls.call(lambda timeout: client.chat.completions.create(
         model="gpt-4o",
         messages=[
             {
@@ -135,7 +136,8 @@ def extract_crbook_info(uploaded_image) -> CRBookInfo:
         ],
         max_tokens=1500,  # Increase max_tokens for longer responses
         temperature=0.1,
-    )
+        timeout=timeout,
+    ))
     
     # Extract JSON from response
     try:
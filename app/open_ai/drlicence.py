@@ -3,13 +3,14 @@ from dotenv import load_dotenv
 import os
 import json
 import base64
+from app.services.resilience import openai_calls
 from app.models.drlicence import LicenceInfo
 
 load_dotenv()
 
 def setup_openai(api_key: str):
-    """Initialize OpenAI client with API key"""
-    return openai.OpenAI(api_key=api_key)
+    """Initialize OpenAI client with API key (retries are left to the call policy)"""
+    return openai.OpenAI(api_key=api_key, max_retries=0)
 
 def extract_licence_info(uploaded_image) -> LicenceInfo:
     """
@@ -49,8 +50,8 @@ def extract_licence_info(uploaded_image) -> LicenceInfo:
     Ensure all dates are in YYYY-MM-DD format and the response is valid JSON.
     """
     
-    # Generate response using OpenAI GPT-4 Vision
-    response = client.chat.completions.create(
+    # Generate response using OpenAI GPT-4 Vision, under the shared OpenAI call policy
+    response = openai_calls.call(lambda timeout: client.chat.completions.create(
         model="gpt-4o",
         messages=[
             {
@@ -68,7 +69,8 @@ def extract_licence_info(uploaded_image) -> LicenceInfo:
         ],
         max_tokens=1000,
         temperature=0.1,
-    )
+        timeout=timeout,
+    ))
     
     # Extract JSON from response
     try:
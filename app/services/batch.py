@@ -0,0 +1,134 @@
+import asyncio
+import io
+import json
+import logging
+import os
+import time
+import zipfile
+from starlette.datastructures import UploadFile
+from app.services.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+DOC_TYPES = ("crbook", "licence", "passport", "electricity", "water", "invoice")
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 4))
+BATCH_MAX_FILE_BYTES = int(os.getenv("UPLOAD_MAX_FILE_BYTES", 25 * 1024 * 1024))
+# Per zip archive: number of files and their combined uncompressed size
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", 500))
+BATCH_MAX_TOTAL_BYTES = int(os.getenv("BATCH_MAX_TOTAL_BYTES", 512 * 1024 * 1024))
+
+# Shared across batches so parallel batch requests respect one provider budget
+batch_rate_limiter = TokenBucket(
+    rate=float(os.getenv("BATCH_RATE_PER_SEC", 5)),
+    burst=int(os.getenv("BATCH_RATE_BURST", 5))
+)
+
+
+def resolve_doc_type(*candidates):
+    """Return the first candidate that is a known document type"""
+    for candidate in candidates:
+        if candidate and candidate.lower() in DOC_TYPES:
+            return candidate.lower()
+    return None
+
+
+def unpack_zip(content: bytes, field_doc_type=None, default_doc_type=None):
+    """
+    List (filename, doc_type, content) for every file in a zip archive. The doc
+    type comes from the top level folder (e.g. crbook/0001.jpg), then the form field.
+    Raises ValueError for archives over the file count or total size limits.
+    """
+    documents = []
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        # Checked from the central directory before anything is decompressed
+        entries = [
+            info for info in archive.infolist()
+            if not info.is_dir() and not info.filename.startswith("__MACOSX/")
+        ]
+        if len(entries) > BATCH_MAX_FILES:
+            raise ValueError(f"Archive has {len(entries)} files, the limit is {BATCH_MAX_FILES}")
+        total = sum(info.file_size for info in entries if info.file_size <= BATCH_MAX_FILE_BYTES)
+        if total > BATCH_MAX_TOTAL_BYTES:
+            raise ValueError(f"Archive unpacks to {total // 1024} KB, the limit is {BATCH_MAX_TOTAL_BYTES // 1024} KB")
+        for info in entries:
+            folder = info.filename.split("/", 1)[0] if "/" in info.filename else None
+            doc_type = resolve_doc_type(folder, field_doc_type, default_doc_type)
+            if info.file_size > BATCH_MAX_FILE_BYTES:
+                documents.append((info.filename, doc_type, ValueError("File exceeds the upload size limit")))
+                continue
+            documents.append((info.filename, doc_type, archive.read(info)))
+    return documents
+
+
+async def read_batch_documents(form, default_doc_type=None):
+    """
+    Collect documents from a multipart form. The form field name selects the doc
+    type (e.g. crbook=@a.jpg) and falls back to the doc_type query parameter.
+    Zip uploads are expanded in place.
+    """
+    documents = []
+    for field, value in form.multi_items():
+        if not isinstance(value, UploadFile) or not value.filename:
+            continue
+        content = await value.read()
+        field_doc_type = resolve_doc_type(field)
+        doc_type = resolve_doc_type(field_doc_type, default_doc_type)
+        if value.filename.lower().endswith(".zip"):
+            try:
+                documents.extend(
+                    await asyncio.to_thread(unpack_zip, content, field_doc_type, default_doc_type)
+                )
+            except (ValueError, zipfile.BadZipFile) as e:
+                documents.append((value.filename, doc_type, e))
+        elif len(content) > BATCH_MAX_FILE_BYTES:
+            documents.append((value.filename, doc_type, ValueError("File exceeds the upload size limit")))
+        else:
+            documents.append((value.filename, doc_type, content))
+    return documents
+
+
+async def run_batch(documents, run_extractor, concurrency=BATCH_CONCURRENCY, rate_limiter=batch_rate_limiter):
+    """
+    Run the extractor over every document with at most `concurrency` in flight
+    and yield one NDJSON line per document as soon as it finishes.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def process(index, filename, doc_type, content):
+        line = {"index": index, "filename": filename, "doc_type": doc_type}
+        if isinstance(content, Exception):
+            return {**line, "status": "error", "error": str(content)}
+        if doc_type is None:
+            return {**line, "status": "error", "error": "Unknown document type"}
+        async with semaphore:
+            await rate_limiter.acquire_async()
+            started = time.perf_counter()
+            try:
+                result = await run_extractor(doc_type, content)
+                line.update(status="ok", extracted_info=result["extracted_info"])
+            except Exception as e:
+                logger.error(f"Batch item {filename} failed: {str(e)}")
+                line.update(status="error", error=str(e))
+            line["elapsed"] = round(time.perf_counter() - started, 3)
+        return line
+
+    tasks = [
+        asyncio.create_task(process(index, filename, doc_type, content))
+        for index, (filename, doc_type, content) in enumerate(documents)
+    ]
+    started = time.perf_counter()
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield json.dumps(await finished, default=str) + "\n"
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    elapsed = time.perf_counter() - started
+    yield json.dumps({
+        "summary": True,
+        "documents": len(documents),
+        "elapsed": round(elapsed, 3),
+        "docs_per_min": round(len(documents) / elapsed * 60, 1) if elapsed else None,
+    }) + "\n"
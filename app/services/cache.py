@@ -0,0 +1,197 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from app.services.executor import run_blocking
+
+logger = logging.getLogger(__name__)
+
+
+def document_key(document, doc_type: str, version: str) -> str:
+    """Build the cache key from the document hash, doc type and extractor version (model, prompt, settings)"""
+    return f"{doc_type}:{version}:{document.sha256}"
+
+
+class ResultCache:
+    """
+    Two tier extraction result cache: an in-memory LRU in front of a SQLite file.
+    Entries expire after `ttl` seconds and the oldest entries are evicted once
+    `max_entries` or `max_bytes` is exceeded.
+    """
+
+    def __init__(self, path=None, ttl=7 * 24 * 3600, max_entries=256, max_bytes=64 * 1024 * 1024,
+                 disk_max_entries=10000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_max_entries = disk_max_entries
+        self._memory = OrderedDict()  # key -> (expires_at, payload, latency)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._db = None
+        self.stats = {
+            "hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expired": 0,
+            "saved_seconds": 0.0,
+        }
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, payload TEXT NOT NULL, latency REAL NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def get(self, key):
+        """Return the cached payload for key or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, payload, latency = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._record_hit("memory_hits", latency)
+                    return json.loads(payload)
+                self._drop_memory(key)
+                self.stats["expired"] += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT payload, latency, expires_at FROM results WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    payload, latency, expires_at = row
+                    if expires_at > now:
+                        self._db.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+                        self._db.commit()
+                        self._put_memory(key, expires_at, payload, latency)
+                        self._record_hit("disk_hits", latency)
+                        return json.loads(payload)
+                    self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                    self._db.commit()
+                    self.stats["expired"] += 1
+
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, key, value, latency=0.0):
+        """Store a JSON serialisable value along with the latency it took to compute"""
+        payload = json.dumps(value, default=str)
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._put_memory(key, expires_at, payload, latency)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, payload, latency, expires_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, payload, latency, expires_at, now)
+                )
+                self._db.execute("DELETE FROM results WHERE expires_at <= ?", (now,))
+                self._db.execute(
+                    "DELETE FROM results WHERE key NOT IN "
+                    "(SELECT key FROM results ORDER BY accessed_at DESC LIMIT ?)",
+                    (self.disk_max_entries,)
+                )
+                self._db.commit()
+            self.stats["stores"] += 1
+
+    def get_or_compute(self, document, doc_type: str, version: str, extractor):
+        """
+        Return the cached extracted info for the document or run the extractor.
+        Only `extracted_info` is cached, the document itself is never stored.
+        """
+        key = document_key(document, doc_type, version)
+        cached = self.get(key)
+        if cached is not None:
+            logger.info(f"Result cache hit for {doc_type}")
+            return {"extracted_info": cached}
+
+        started = time.perf_counter()
+        result = extractor(document)
+        self.set(key, result["extracted_info"], time.perf_counter() - started)
+        return result
+
+    async def get_or_compute_async(self, document, doc_type: str, version: str, extractor):
+        """
+        Async variant of get_or_compute for coroutine extractors. Hashing and the
+        SQLite lookup run on the model thread pool to keep the event loop free.
+        """
+        key = await run_blocking(document_key, document, doc_type, version)
+        cached = await run_blocking(self.get, key)
+        if cached is not None:
+            logger.info(f"Result cache hit for {doc_type}")
+            return {"extracted_info": cached}
+
+        started = time.perf_counter()
+        result = await extractor(document)
+        await run_blocking(self.set, key, result["extracted_info"], time.perf_counter() - started)
+        return result
+
+    def clear(self):
+        """Remove every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM results")
+                self._db.commit()
+
+    def close(self):
+        """Close the disk tier"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def snapshot(self):
+        """Return the hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+            }
+
+    def _record_hit(self, tier, latency):
+        self.stats["hits"] += 1
+        self.stats[tier] += 1
+        self.stats["saved_seconds"] += latency
+
+    def _put_memory(self, key, expires_at, payload, latency):
+        if len(payload) > self.max_bytes:
+            return
+        self._drop_memory(key)
+        self._memory[key] = (expires_at, payload, latency)
+        self._memory_bytes += len(payload)
+        while len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes:
+            _, (_, evicted, _) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.stats["evictions"] += 1
+
+    def _drop_memory(self, key):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= len(entry[1])
+
+
+result_cache = ResultCache(
+    path=os.getenv("RESULT_CACHE_PATH", "result_cache.sqlite3") or None,
+    ttl=int(os.getenv("RESULT_CACHE_TTL", 7 * 24 * 3600)),
+    max_entries=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 256)),
+    max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+    disk_max_entries=int(os.getenv("RESULT_CACHE_DISK_MAX_ENTRIES", 10000)),
+)
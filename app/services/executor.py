@@ -0,0 +1,19 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Bounded pool for blocking model SDK calls so they never run on the event loop
+model_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("MODEL_POOL_SIZE", 16)),
+    thread_name_prefix="model-call"
+)
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking function on the model thread pool and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(model_pool, functools.partial(func, *args, **kwargs))
+
+def shutdown_pool():
+    """Stop accepting work and wait for in-flight model calls"""
+    model_pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,220 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobQueue:
+    """
+    Persistent background job queue for long extractions. Jobs live in SQLite so
+    queued work survives a restart and several worker processes on the host can
+    share the queue. A job is claimed with a lease that its worker renews while the
+    job runs; if the worker dies the lease expires and another worker picks the job
+    up again, up to max_attempts times.
+    """
+
+    def __init__(self, path, runner, workers=2, poll_interval=1.0, lease=600, retention=24 * 3600, max_attempts=3):
+        self.runner = runner
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.retention = retention
+        self.max_attempts = max_attempts
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._wakeup = None
+        self._stopping = False
+        self._tasks = []
+        self._owner = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, doc_type TEXT NOT NULL, status TEXT NOT NULL, "
+                "payload BLOB, result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL, lease_until REAL, owner TEXT, preview_key TEXT)"
+            )
+            # Databases created before preview keys were stored on the job
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(jobs)")]
+            if "preview_key" not in columns:
+                self._db.execute("ALTER TABLE jobs ADD COLUMN preview_key TEXT")
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            self._db.commit()
+
+    async def start(self):
+        """Start the worker tasks; jobs queued before a restart are picked up again"""
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        await asyncio.to_thread(self._purge)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Job queue started with {self.workers} workers")
+
+    async def stop(self):
+        """Stop the workers. Running jobs are released back to the queue"""
+        # wait_for can swallow a cancel that races with a wakeup, so also flag the stop
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        with self._lock:
+            # A job interrupted by a shutdown does not count as a failed attempt
+            self._db.execute(
+                "UPDATE jobs SET status = ?, lease_until = NULL, owner = NULL, attempts = attempts - 1 "
+                "WHERE owner = ? AND status = ?",
+                (QUEUED, self._owner, RUNNING)
+            )
+            self._db.commit()
+            self._db.close()
+
+    async def submit(self, doc_type: str, content: bytes, preview_key: str = None) -> str:
+        """
+        Queue a document for extraction and return its job ID. preview_key is the
+        upload store key the document can be displayed from alongside the result.
+        """
+        job_id = uuid.uuid4().hex
+        await asyncio.to_thread(self._insert, job_id, doc_type, content, preview_key)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    def get(self, job_id: str, include_payload=False):
+        """Return the job as a dict, or None if it does not exist"""
+        columns = "id, doc_type, status, result, error, attempts, created_at, updated_at, preview_key"
+        if include_payload:
+            columns += ", payload"
+        with self._lock:
+            cursor = self._db.execute(f"SELECT {columns} FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            names = [d[0] for d in cursor.description]
+        if row is None:
+            return None
+        job = dict(zip(names, row))
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    async def wait(self, job_id: str, timeout=300.0):
+        """Yield the job each time its status changes until it finishes"""
+        deadline = time.monotonic() + timeout
+        last_status = None
+        while time.monotonic() < deadline:
+            job = await asyncio.to_thread(self.get, job_id)
+            if job is None:
+                return
+            if job["status"] != last_status:
+                last_status = job["status"]
+                yield job
+            if job["status"] in (DONE, FAILED):
+                return
+            await asyncio.sleep(0.5)
+
+    def _insert(self, job_id, doc_type, content, preview_key):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, doc_type, status, payload, preview_key, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, doc_type, QUEUED, content, preview_key, now, now)
+            )
+            self._db.commit()
+
+    def _claim(self):
+        """Atomically take the oldest queued job, or one whose lease has expired"""
+        now = time.time()
+        with self._lock:
+            # A job whose lease keeps expiring is taking its worker down with it (OOM,
+            # crash in a native library); give up on it instead of reclaiming it forever
+            abandoned = self._db.execute(
+                "UPDATE jobs SET status = ?, payload = NULL, error = ?, lease_until = NULL, updated_at = ? "
+                "WHERE status = ? AND lease_until < ? AND attempts >= ? RETURNING id",
+                (FAILED, f"Abandoned after {self.max_attempts} attempts", now, RUNNING, now, self.max_attempts)
+            ).fetchall()
+            for (job_id,) in abandoned:
+                logger.error(f"Job {job_id} abandoned after {self.max_attempts} attempts")
+            row = self._db.execute(
+                "UPDATE jobs SET status = ?, lease_until = ?, owner = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE id = (SELECT id FROM jobs WHERE status = ? OR (status = ? AND lease_until < ?) "
+                "ORDER BY created_at LIMIT 1) RETURNING id, doc_type, payload",
+                (RUNNING, now + self.lease, self._owner, now, QUEUED, RUNNING, now)
+            ).fetchone()
+            self._db.commit()
+        return row
+
+    def _renew(self, job_id):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND owner = ? AND status = ?",
+                (time.time() + self.lease, job_id, self._owner, RUNNING)
+            )
+            self._db.commit()
+
+    async def _heartbeat(self, job_id):
+        """Renew the job's lease every third of its length, so a slow extraction is not claimed twice"""
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            await asyncio.to_thread(self._renew, job_id)
+
+    def _finish(self, job_id, status, result=None, error=None):
+        # The upload is no longer needed once the job has finished
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, payload = NULL, result = ?, error = ?, lease_until = NULL, updated_at = ? "
+                "WHERE id = ?",
+                (status, json.dumps(result, default=str) if result is not None else None, error, time.time(), job_id)
+            )
+            self._db.commit()
+
+    def _purge(self):
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (DONE, FAILED, time.time() - self.retention)
+            )
+            self._db.commit()
+
+    async def _worker(self, number):
+        while not self._stopping:
+            claimed = await asyncio.to_thread(self._claim)
+            if claimed is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            job_id, doc_type, payload = claimed
+            logger.info(f"Worker {number} running {doc_type} job {job_id}")
+            heartbeat = asyncio.create_task(self._heartbeat(job_id))
+            try:
+                result = await self.runner(doc_type, payload)
+                await asyncio.to_thread(self._finish, job_id, DONE, result["extracted_info"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {str(e)}", exc_info=True)
+                await asyncio.to_thread(self._finish, job_id, FAILED, None, str(e))
+            finally:
+                heartbeat.cancel()
+
+
+def create_job_queue(runner) -> JobQueue:
+    """Build the job queue from environment configuration"""
+    return JobQueue(
+        path=os.getenv("JOBS_DB_PATH", "jobs.sqlite3"),
+        runner=runner,
+        workers=int(os.getenv("JOB_WORKERS", 2)),
+        lease=int(os.getenv("JOB_LEASE_SECONDS", 600)),
+        retention=int(os.getenv("JOB_RETENTION_SECONDS", 24 * 3600)),
+        max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", 3)),
+    )
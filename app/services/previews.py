@@ -0,0 +1,73 @@
+import re
+from io import BytesIO
+import PIL.Image
+from PIL import ImageOps
+from starlette.responses import Response
+from app.gemini.preprocess import flatten_image
+
+THUMBNAIL_MAX_EDGE = 1024
+
+_range_pattern = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+def make_thumbnail(document, max_edge=THUMBNAIL_MAX_EDGE) -> bytes:
+    """Render a JPEG thumbnail of an image or the first page of a PDF"""
+    if document.is_pdf:
+        import fitz  # PyMuPDF
+        with fitz.open(stream=document.content, filetype="pdf") as doc:
+            page = doc.load_page(0)
+            zoom = max_edge / max(page.rect.width, page.rect.height)
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+            image = PIL.Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    else:
+        image = PIL.Image.open(BytesIO(document.content))
+        image.draft("RGB", (max_edge, max_edge))
+        image = ImageOps.exif_transpose(image)
+        image = flatten_image(image)
+        image.thumbnail((max_edge, max_edge), PIL.Image.LANCZOS)
+
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=80)
+    return buffer.getvalue()
+
+
+def not_modified(request, etag) -> bool:
+    """True when the client already holds this ETag"""
+    return etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
+
+
+def preview_response(request, content: bytes, media_type: str, etag: str) -> Response:
+    """
+    Serve stored bytes with an ETag and single byte-range support, so browser PDF
+    viewers can fetch pages on demand and unchanged previews revalidate with a 304.
+    """
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=3600",
+    }
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    size = len(content)
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range == etag):
+        match = _range_pattern.match(range_header.strip())
+        if match and match.group(1) + match.group(2):
+            start, end = match.group(1), match.group(2)
+            if start:
+                start, end = int(start), min(int(end), size - 1) if end else size - 1
+            else:
+                # Suffix range: the last N bytes
+                start, end = max(0, size - int(end)), size - 1
+            if start > end or start >= size:
+                return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+            return Response(
+                content[start:end + 1],
+                status_code=206,
+                media_type=media_type,
+                headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}"}
+            )
+
+    return Response(content, media_type=media_type, headers=headers)
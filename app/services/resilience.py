@@ -0,0 +1,171 @@
+import logging
+import os
+import random
+import threading
+import time
+from app.services.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth retrying: timeouts, rate limiting and transient server errors
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+# Exception names used by the Gemini and OpenAI SDKs for transient failures
+RETRYABLE_ERRORS = {
+    "TimeoutError", "ConnectionError", "DeadlineExceeded", "ServiceUnavailable", "ResourceExhausted",
+    "InternalServerError", "TooManyRequests", "APITimeoutError", "APIConnectionError", "RateLimitError",
+    "ReadTimeout", "ConnectTimeout", "RemoteProtocolError",
+}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(RuntimeError):
+    """Raised without calling the provider while its circuit breaker is open"""
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether an SDK error is transient (timeout, 429, 5xx) rather than a bad request"""
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    try:
+        if int(status) in RETRYABLE_STATUSES:
+            return True
+    except (TypeError, ValueError):
+        pass
+    return any(cls.__name__ in RETRYABLE_ERRORS for cls in type(error).__mro__)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive transient failures and rejects
+    calls for `reset_timeout` seconds; then lets a single trial call through,
+    closing again if it succeeds.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._trial_running = False
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(f"{self.name} circuit opened after {self._failures} consecutive failures")
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self._trial_running = False
+
+
+class CallPolicy:
+    """
+    Timeouts, retries, rate limiting and circuit breaking for one model provider.
+    call(func) invokes func(timeout) with the seconds the attempt may take, so the
+    SDK call can pass it on as its request timeout. Transient errors are retried
+    with jittered exponential backoff until `retries` or the overall `deadline`
+    run out; every attempt first takes a token from the provider's rate limiter.
+    """
+
+    def __init__(self, name, timeout=60.0, deadline=180.0, retries=3, backoff=1.0, max_backoff=20.0,
+                 rate=10.0, burst=10, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.timeout = timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.limiter = TokenBucket(rate=rate, burst=burst)
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "attempts": 0, "retries": 0, "failures": 0, "rejected": 0}
+
+    @classmethod
+    def from_env(cls, name: str) -> "CallPolicy":
+        """Build a policy from <NAME>_CALL_* / <NAME>_RATE_* environment variables"""
+        prefix = name.upper()
+        return cls(
+            name,
+            timeout=float(os.getenv(f"{prefix}_CALL_TIMEOUT", 60)),
+            deadline=float(os.getenv(f"{prefix}_CALL_DEADLINE", 180)),
+            retries=int(os.getenv(f"{prefix}_CALL_RETRIES", 3)),
+            rate=float(os.getenv(f"{prefix}_RATE_PER_SEC", 10)),
+            burst=int(os.getenv(f"{prefix}_RATE_BURST", 10)),
+            failure_threshold=int(os.getenv(f"{prefix}_CIRCUIT_FAILURES", 5)),
+            reset_timeout=float(os.getenv(f"{prefix}_CIRCUIT_RESET", 30)),
+        )
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def call(self, func):
+        """Run func(timeout) under the policy and return its result"""
+        self._count("calls")
+        started = time.monotonic()
+        attempt = 0
+        last_error = None
+        while True:
+            if not self.breaker.allow():
+                # Also stops retries once this call's failures have opened the circuit
+                self._count("rejected")
+                raise CircuitOpen(f"{self.name} is failing, not calling it for up to {self.breaker.reset_timeout:g}s") from last_error
+            self.limiter.acquire()
+            remaining = self.deadline - (time.monotonic() - started)
+            self._count("attempts")
+            try:
+                result = func(max(min(self.timeout, remaining), 1.0))
+            except Exception as e:
+                if not is_retryable(e):
+                    # The provider answered; a bad request says nothing about its health
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                self._count("failures")
+                last_error = e
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                attempt += 1
+                if attempt > self.retries or time.monotonic() - started + delay >= self.deadline:
+                    logger.error(f"{self.name} call failed after {attempt} attempts: {str(e)}")
+                    raise
+                logger.warning(f"{self.name} call failed ({type(e).__name__}: {str(e)}), retrying in {delay:.1f}s")
+                self._count("retries")
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+    def snapshot(self) -> dict:
+        """Return call counters and the circuit state"""
+        with self._lock:
+            return {**self.stats, "circuit": self.breaker.state}
+
+
+# One policy per provider, shared by every extractor calling it
+gemini_calls = CallPolicy.from_env("gemini")
+openai_calls = CallPolicy.from_env("openai")
@@ -0,0 +1,223 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:  # Only needed for the shared backend
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class UploadTooLarge(ValueError):
+    """Raised when an upload exceeds the configured per-file size cap"""
+
+
+class UploadStore(ABC):
+    """
+    Base class for upload stores. Uploads are keyed by an opaque upload key
+    (session ID + doc type) and expire after `ttl` seconds of inactivity.
+    """
+
+    def __init__(self, ttl=3600, max_item_bytes=25 * 1024 * 1024, max_bytes=512 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_item_bytes = max_item_bytes
+        self.max_bytes = max_bytes
+
+    @abstractmethod
+    def put(self, key: str, content: bytes):
+        """Store an upload, replacing any previous one under the key"""
+
+    @abstractmethod
+    def get(self, key: str):
+        """Return the upload's bytes, or None if it is missing or expired"""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Remove an upload if present"""
+
+    def close(self):
+        """Release resources held by the store"""
+
+    def _check_size(self, content: bytes):
+        if len(content) > self.max_item_bytes:
+            raise UploadTooLarge(
+                f"File is {len(content) // 1024} KB, the limit is {self.max_item_bytes // 1024} KB"
+            )
+
+
+class MemoryUploadStore(UploadStore):
+    """Single process LRU store, the default for one worker"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._items = OrderedDict()  # key -> (expires_at, content)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, key, content):
+        self._check_size(content)
+        with self._lock:
+            self._pop(key)
+            self._items[key] = (time.time() + self.ttl, content)
+            self._bytes += len(content)
+            self._evict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                return None
+            expires_at, content = entry
+            if expires_at <= time.time():
+                self._pop(key)
+                return None
+            self._items[key] = (time.time() + self.ttl, content)
+            self._items.move_to_end(key)
+            return content
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def close(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def _pop(self, key):
+        entry = self._items.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def _evict(self):
+        now = time.time()
+        for key in [key for key, (expires_at, _) in self._items.items() if expires_at <= now]:
+            self._pop(key)
+        while self._bytes > self.max_bytes and self._items:
+            _, (_, content) = self._items.popitem(last=False)
+            self._bytes -= len(content)
+
+
+class SpoolUploadStore(UploadStore):
+    """
+    Spools uploads to a directory so every worker on the host sees them.
+    File mtimes track last access for both TTL expiry and LRU eviction.
+    """
+
+    def __init__(self, directory=None, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory or os.path.join(tempfile.gettempdir(), "ocr-uploads")
+        os.makedirs(self.directory, exist_ok=True)
+
+    def put(self, key, content):
+        self._check_size(content)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, self._path(key))
+        self._evict()
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if os.path.getmtime(path) + self.ttl <= time.time():
+                os.remove(path)
+                return None
+            with open(path, "rb") as f:
+                content = f.read()
+            os.utime(path)
+            return content
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + ".upload")
+
+    def _evict(self):
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".upload"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime + self.ttl <= now:
+                self._remove(entry.path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class RedisUploadStore(UploadStore):
+    """
+    Shared store for multiple hosts, talking to any Redis protocol server.
+    Expiry uses Redis TTLs; LRU eviction is left to the server's maxmemory policy.
+    """
+
+    def __init__(self, url="redis://localhost:6379/0", prefix="upload:", **kwargs):
+        super().__init__(**kwargs)
+        if redis is None:
+            raise ImportError("The redis package is required for UPLOAD_STORE=redis")
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def put(self, key, content):
+        self._check_size(content)
+        self._client.set(self.prefix + key, content, ex=self.ttl)
+
+    def get(self, key):
+        pipe = self._client.pipeline()
+        pipe.get(self.prefix + key)
+        pipe.expire(self.prefix + key, self.ttl)
+        content, _ = pipe.execute()
+        return content
+
+    def delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def close(self):
+        self._client.close()
+
+
+def create_upload_store() -> UploadStore:
+    """Build the upload store selected by the UPLOAD_STORE environment variable"""
+    backend = os.getenv("UPLOAD_STORE", "memory")
+    limits = dict(
+        ttl=int(os.getenv("UPLOAD_TTL", 3600)),
+        max_item_bytes=int(os.getenv("UPLOAD_MAX_FILE_BYTES", 25 * 1024 * 1024)),
+        max_bytes=int(os.getenv("UPLOAD_MAX_TOTAL_BYTES", 512 * 1024 * 1024)),
+    )
+    if backend == "memory":
+        return MemoryUploadStore(**limits)
+    if backend == "spool":
+        return SpoolUploadStore(directory=os.getenv("UPLOAD_SPOOL_DIR"), **limits)
+    if backend == "redis":
+        return RedisUploadStore(url=os.getenv("UPLOAD_REDIS_URL", "redis://localhost:6379/0"), **limits)
+    raise ValueError(f"Unknown UPLOAD_STORE backend: {backend}")
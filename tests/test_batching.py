@@ -0,0 +1,137 @@
+"""MicroBatcher coalescing and batched extraction, against stub batch runners and a stub model"""
+import json
+import threading
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip("google.generativeai")
+
+from pydantic import BaseModel
+from app.gemini import batching
+from app.gemini.batching import MicroBatcher, generate_batch
+
+
+def submit_all(batcher, items):
+    """Submit each item from its own thread; returns {item: result or exception}"""
+    results = {}
+    start = threading.Barrier(len(items))
+
+    def worker(item):
+        start.wait()
+        try:
+            results[item] = batcher.submit(item)
+        except Exception as e:
+            results[item] = e
+
+    threads = [threading.Thread(target=worker, args=(item,)) for item in items]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results
+
+
+class Recorder:
+    def __init__(self, fail=None):
+        self.batches = []
+        self.fail = fail
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        if self.fail:
+            raise self.fail
+        return [item * 10 for item in items]
+
+
+def test_concurrent_calls_share_a_batch():
+    run = Recorder()
+    # A long wait: the batch must go as soon as it is full
+    batcher = MicroBatcher("test", run, max_batch=4, max_wait=5)
+    assert submit_all(batcher, [1, 2, 3, 4]) == {1: 10, 2: 20, 3: 30, 4: 40}
+    assert [sorted(batch) for batch in run.batches] == [[1, 2, 3, 4]]
+
+
+def test_batches_are_split_at_max_batch():
+    run = Recorder()
+    batcher = MicroBatcher("test", run, max_batch=3, max_wait=0.2)
+    items = list(range(1, 8))
+    assert submit_all(batcher, items) == {item: item * 10 for item in items}
+    assert all(len(batch) <= 3 for batch in run.batches)
+    assert sorted(item for batch in run.batches for item in batch) == items
+
+
+def test_lone_call_is_flushed_after_max_wait():
+    run = Recorder()
+    batcher = MicroBatcher("test", run, max_batch=8, max_wait=0.05)
+    assert batcher.submit(7) == 70
+    assert run.batches == [[7]]
+
+
+def test_batch_errors_reach_every_caller():
+    run = Recorder(fail=ValueError("boom"))
+    batcher = MicroBatcher("test", run, max_batch=3, max_wait=5)
+    results = submit_all(batcher, [1, 2, 3])
+    assert all(isinstance(result, ValueError) for result in results.values())
+    # The batcher recovers for later calls
+    run.fail = None
+    batcher.max_wait = 0.05
+    assert batcher.submit(4) == 40
+
+
+class Info(BaseModel):
+    name: str
+
+
+class StubModel:
+    """Answers each request from a queue of JSON texts and records the contents it was sent"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def generate_content(self, contents, generation_config=None, request_options=None):
+        self.requests.append(contents)
+        return SimpleNamespace(text=json.dumps(self.responses.pop(0)), usage_metadata=None)
+
+
+def test_generate_batch_maps_results_by_index():
+    model = StubModel([{"index": 1, "name": "b"}, {"index": 0, "name": "a"}])
+    assert generate_batch("test", model, "Read the name.", ["image a", "image b"], Info) == [{"name": "a"}, {"name": "b"}]
+    assert len(model.requests) == 1
+    assert model.requests[0][1:] == ["Document 0:", "image a", "Document 1:", "image b"]
+
+
+def test_generate_batch_retries_documents_missing_from_the_response():
+    model = StubModel([{"index": 0, "name": "a"}], {"name": "b"})
+    assert generate_batch("test", model, None, ["image a", "image b"], Info) == [{"name": "a"}, {"name": "b"}]
+    assert model.requests[1] == ["image b"]
+
+
+def test_generate_json_batches_only_matching_prompts(monkeypatch):
+    calls = []
+
+    def fake_generate_batch(doc_type, model, prompt, images, schema_model):
+        calls.append((prompt, sorted(images)))
+        return [f"{prompt}:{image}" for image in images]
+
+    monkeypatch.setattr(batching, "GEMINI_BATCH_SIZE", 4)
+    monkeypatch.setattr(batching, "GEMINI_BATCH_WAIT_MS", 200)
+    monkeypatch.setattr(batching, "_batchers", {})
+    monkeypatch.setattr(batching, "generate_batch", fake_generate_batch)
+
+    jobs = [("p", "a"), ("p", "b"), ("q", "c"), ("q", "d")]
+    results = {}
+    start = threading.Barrier(len(jobs))
+
+    def worker(prompt, image):
+        start.wait()
+        results[image] = batching.generate_json("test", None, prompt, image, Info)
+
+    threads = [threading.Thread(target=worker, args=job) for job in jobs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert results == {"a": "p:a", "b": "p:b", "c": "q:c", "d": "q:d"}
+    assert sorted(calls) == [("p", ["a", "b"]), ("q", ["c", "d"])]
@@ -0,0 +1,67 @@
+"""
+cluster_line_points against the loop it replaced in the CR book outline
+detection, which put each Hough endpoint into the first group whose key was
+within the threshold, over random point sets.
+"""
+from collections import defaultdict
+import numpy as np
+import pytest
+from app.ocr.crbook import cluster_line_points
+
+
+def reference_clusters(points, axis, threshold=5):
+    groups = defaultdict(list)
+    for point in points.tolist():
+        coord = point[axis]
+        for key in groups.keys():
+            if abs(coord - key) <= threshold:
+                groups[key].append(point)
+                break
+        else:
+            groups[coord].append(point)
+    averages, mins, maxs = [], [], []
+    for group in groups.values():
+        averages.append(int(np.mean([point[axis] for point in group])))
+        mins.append(min(point[1 - axis] for point in group))
+        maxs.append(max(point[1 - axis] for point in group))
+    return averages, mins, maxs
+
+
+def random_points(rng):
+    # Hough endpoints bunch up around a few lines, with some strays
+    count = rng.integers(1, 200)
+    lines = rng.integers(0, 2000, size=rng.integers(1, 12))
+    coords = rng.choice(lines, size=count) + rng.integers(-8, 9, size=count)
+    strays = rng.random(count) < 0.1
+    coords[strays] = rng.integers(0, 2000, size=strays.sum())
+    others = rng.integers(0, 3000, size=count)
+    return np.stack([coords, others], axis=1).astype(np.int32)
+
+
+@pytest.mark.parametrize("axis", [0, 1])
+def test_matches_reference_on_random_points(axis):
+    rng = np.random.default_rng(14)
+    for _ in range(500):
+        points = random_points(rng)
+        if axis:
+            points = points[:, ::-1]
+        averages, mins, maxs = cluster_line_points(points, axis=axis)
+        assert (averages.tolist(), mins.tolist(), maxs.tolist()) == reference_clusters(points, axis), points.tolist()
+
+
+@pytest.mark.parametrize("threshold", [0, 1, 5, 20])
+def test_matches_reference_for_thresholds(threshold):
+    rng = np.random.default_rng(threshold)
+    for _ in range(100):
+        points = random_points(rng)
+        averages, mins, maxs = cluster_line_points(points, axis=0, threshold=threshold)
+        assert (averages.tolist(), mins.tolist(), maxs.tolist()) == reference_clusters(points, 0, threshold), points.tolist()
+
+
+def test_groups_are_measured_from_their_anchor():
+    # 16 is within 5 of 13 but not of the group's anchor 10, so it starts its own group
+    points = np.array([[10, 0], [13, 5], [16, 9], [17, 1]], dtype=np.int32)
+    averages, mins, maxs = cluster_line_points(points, axis=0)
+    assert averages.tolist() == [11, 16]
+    assert mins.tolist() == [0, 1]
+    assert maxs.tolist() == [5, 9]
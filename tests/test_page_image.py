@@ -0,0 +1,64 @@
+"""PageImage decoding and its cached colour, gray and binary views, on a synthetic page"""
+import cv2
+import numpy as np
+import pytest
+from app.ocr.crbook import PageImage, crop_field, horizontal_detector, vertical_detector
+
+
+def synthetic_page():
+    # A white page with a dark outline, a table rule and a coloured block
+    page = np.full((400, 600, 3), 255, np.uint8)
+    cv2.rectangle(page, (30, 20), (570, 380), (0, 0, 0), 3)
+    cv2.line(page, (30, 200), (570, 200), (40, 40, 40), 2)
+    page[60:120, 100:250] = (200, 30, 10)
+    return page
+
+
+def png_bytes(image):
+    ok, encoded = cv2.imencode(".png", image)
+    assert ok
+    return encoded.tobytes()
+
+
+def test_decodes_bytes_and_keeps_arrays():
+    image = synthetic_page()
+    assert np.array_equal(PageImage(png_bytes(image)).bgr, image)
+    assert PageImage(image).bgr is image
+
+
+def test_rejects_undecodable_bytes():
+    with pytest.raises(ValueError):
+        PageImage(b"not an image")
+
+
+def test_views_match_cv2_conversions():
+    image = synthetic_page()
+    page = PageImage(png_bytes(image))
+    assert np.array_equal(page.rgb, cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    assert np.array_equal(page.gray, cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+    _, otsu = cv2.threshold(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), 128, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    assert np.array_equal(page.binary, 255 - otsu)
+    # Ink is white in the inverted binary
+    assert page.binary[20, 300] == 255 and page.binary[300, 300] == 0
+
+
+def test_views_are_computed_once():
+    page = PageImage(synthetic_page())
+    assert page.rgb is page.rgb
+    assert page.gray is page.gray
+    assert page.binary is page.binary
+    # Both detectors read the same cached binary without modifying it
+    binary = page.binary.copy()
+    vertical_detector(page)
+    horizontal_detector(page)
+    assert page.binary is page.__dict__["binary"]
+    assert np.array_equal(page.binary, binary)
+
+
+def test_crop_field_slices_the_percentage_region():
+    page = PageImage(synthetic_page())
+    field = crop_field(page.rgb, (10, 25, 50, 50))
+    assert field.shape == (100, 240, 3)
+    assert np.array_equal(field, page.rgb[100:200, 60:300])
+    # The threshold widens the region and is clipped to the page
+    assert crop_field(page.rgb, (0, 0, 50, 50), threshold_percentage=5).shape == (220, 330, 3)
@@ -0,0 +1,82 @@
+"""TokenBucket refill and waiting, on a fake clock"""
+import asyncio
+import pytest
+from app.services import ratelimit
+from app.services.ratelimit import TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit, "time", clock)
+    return clock
+
+
+def test_burst_is_available_at_once(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.sleeps == []
+
+
+def test_waits_for_the_next_token(clock):
+    bucket = TokenBucket(rate=2, burst=1)
+    bucket.acquire()
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.sleeps == [0.5, 0.5]
+
+
+def test_refills_at_rate_up_to_burst(clock):
+    bucket = TokenBucket(rate=2, burst=2)
+    bucket.acquire()
+    bucket.acquire()
+    clock.now += 0.5
+    assert bucket._reserve() == 0.0
+    assert bucket._reserve() == pytest.approx(0.5)
+    # A long idle period refills no more than the burst
+    clock.now += 60
+    assert [bucket._reserve() for _ in range(3)] == [0.0, 0.0, pytest.approx(0.5)]
+
+
+def test_waiting_callers_queue_behind_each_other(clock):
+    bucket = TokenBucket(rate=4, burst=1)
+    waits = [bucket._reserve() for _ in range(4)]
+    assert waits == [0.0, pytest.approx(0.25), pytest.approx(0.5), pytest.approx(0.75)]
+
+
+def test_zero_rate_never_waits(clock):
+    bucket = TokenBucket(rate=0, burst=1)
+    for _ in range(5):
+        bucket.acquire()
+    assert clock.sleeps == []
+
+
+def test_acquire_async_sleeps_for_the_wait(clock, monkeypatch):
+    slept = []
+
+    async def fake_sleep(seconds):
+        slept.append(seconds)
+
+    monkeypatch.setattr(ratelimit.asyncio, "sleep", fake_sleep)
+    bucket = TokenBucket(rate=10, burst=1)
+
+    async def run():
+        await bucket.acquire_async()
+        await bucket.acquire_async()
+
+    asyncio.run(run())
+    assert slept == [pytest.approx(0.1)]
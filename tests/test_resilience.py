@@ -0,0 +1,179 @@
+"""
+CallPolicy and CircuitBreaker behaviour under injected faults. A fake clock
+stands in for time.monotonic/time.sleep and jitter is pinned to its upper
+bound, so backoff delays and deadlines are exact.
+"""
+import pytest
+from app.services import resilience
+from app.services.resilience import CLOSED, HALF_OPEN, OPEN, CallPolicy, CircuitBreaker, CircuitOpen, is_retryable
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class Flaky:
+    """Callable failing `failures` times with `error` before returning "ok", taking `duration` seconds per call"""
+
+    def __init__(self, clock, failures=0, error=TimeoutError, duration=0.0):
+        self.clock = clock
+        self.failures = failures
+        self.error = error
+        self.duration = duration
+        self.timeouts = []
+
+    def __call__(self, timeout):
+        self.timeouts.append(timeout)
+        self.clock.now += self.duration
+        if self.failures:
+            self.failures -= 1
+            raise self.error("injected")
+        return "ok"
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(resilience, "time", clock)
+    monkeypatch.setattr(resilience.random, "uniform", lambda low, high: high)
+    return clock
+
+
+def policy(**kwargs):
+    # rate=0 turns the rate limiter off, it has its own tests
+    options = dict(timeout=60, deadline=180, retries=3, backoff=1.0, max_backoff=20.0, rate=0, failure_threshold=10)
+    options.update(kwargs)
+    return CallPolicy("test", **options)
+
+
+def test_retries_transient_errors_with_exponential_backoff(clock):
+    calls = policy()
+    func = Flaky(clock, failures=2)
+    assert calls.call(func) == "ok"
+    assert clock.sleeps == [1.0, 2.0]
+    assert calls.snapshot() == {"calls": 1, "attempts": 3, "retries": 2, "failures": 2, "rejected": 0, "circuit": CLOSED}
+
+
+def test_backoff_is_capped(clock):
+    calls = policy(retries=6, max_backoff=5.0)
+    calls.call(Flaky(clock, failures=5))
+    assert clock.sleeps == [1.0, 2.0, 4.0, 5.0, 5.0]
+
+
+def test_gives_up_after_the_retries(clock):
+    calls = policy(retries=2)
+    func = Flaky(clock, failures=10)
+    with pytest.raises(TimeoutError):
+        calls.call(func)
+    assert len(func.timeouts) == 3
+    assert calls.snapshot()["failures"] == 3
+
+
+def test_attempt_timeouts_shrink_to_the_deadline(clock):
+    calls = policy(timeout=60, deadline=5)
+    func = Flaky(clock, failures=10, duration=3)
+    with pytest.raises(TimeoutError):
+        calls.call(func)
+    # 5s left for the first attempt; after 3s and a 1s backoff only 1s is left
+    assert func.timeouts == [5.0, 1.0]
+
+
+def test_no_retry_when_the_backoff_would_pass_the_deadline(clock):
+    calls = policy(deadline=2, backoff=4.0)
+    func = Flaky(clock, failures=1)
+    with pytest.raises(TimeoutError):
+        calls.call(func)
+    assert clock.sleeps == []
+
+
+def test_bad_requests_are_not_retried_and_keep_the_circuit_closed(clock):
+    calls = policy(failure_threshold=1)
+    func = Flaky(clock, failures=1, error=lambda message: StatusError(400))
+    with pytest.raises(StatusError):
+        calls.call(func)
+    assert len(func.timeouts) == 1
+    assert calls.breaker.state == CLOSED
+
+
+def test_is_retryable():
+    assert is_retryable(StatusError(503))
+    assert is_retryable(StatusError(429))
+    assert not is_retryable(StatusError(400))
+    assert is_retryable(TimeoutError())
+    assert is_retryable(ConnectionResetError())
+    assert not is_retryable(ValueError())
+
+
+def test_open_circuit_rejects_without_calling(clock):
+    calls = policy(retries=5, failure_threshold=2, reset_timeout=30)
+    func = Flaky(clock, failures=10)
+    with pytest.raises(CircuitOpen) as raised:
+        calls.call(func)
+    # The second failure opens the circuit and stops the retries
+    assert len(func.timeouts) == 2
+    assert isinstance(raised.value.__cause__, TimeoutError)
+
+    healthy = Flaky(clock)
+    with pytest.raises(CircuitOpen):
+        calls.call(healthy)
+    assert healthy.timeouts == []
+    assert calls.snapshot()["rejected"] == 2
+
+    clock.now += 30
+    assert calls.call(healthy) == "ok"
+    assert calls.breaker.state == CLOSED
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_breaker_half_open_lets_one_trial_through(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 29.9
+    assert not breaker.allow()
+    clock.now += 0.1
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_breaker_reopens_when_the_trial_fails(clock):
+    breaker = CircuitBreaker("test", failure_threshold=5, reset_timeout=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    clock.now += 30
+    assert breaker.allow()
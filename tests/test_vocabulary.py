@@ -0,0 +1,86 @@
+"""
+Vocabulary must pick the same line and target as the loops it replaced, which
+took the first text, then the first target, with fuzzywuzzy's fuzz.ratio above
+the cutoff. Checked for the rapidfuzz cdist path with its length prefilter and
+for the fuzzywuzzy fallback, over the OCR lines recorded in tests/golden and
+noisy variants of the CR book targets.
+"""
+import json
+import os
+import random
+import pytest
+from fuzzywuzzy import fuzz as fuzzywuzzy_fuzz
+from app.ocr import crbook, vocabulary
+from app.ocr.vocabulary import Vocabulary
+
+GOLDEN = os.path.join(os.path.dirname(__file__), "golden")
+
+VOCABULARIES = [
+    crbook.class_of_vehicle_vocabulary,
+    crbook.taxation_class_vocabulary,
+    crbook.status_when_reg_vocabulary,
+    crbook.fuel_type_vocabulary,
+    crbook.manufacturer_vocabulary,
+]
+
+
+def reference_first_match(targets, cutoff, texts):
+    for text in texts:
+        for target in targets:
+            if fuzzywuzzy_fuzz.ratio(target, text) > cutoff:
+                return text, target
+    return None, None
+
+
+def golden_line_sets():
+    with open(os.path.join(GOLDEN, "crbook_fields.jsonl"), encoding="utf-8") as f:
+        for line in f:
+            result = json.loads(line)["result"]
+            yield crbook.ocr_lines(result).split("\n")
+
+
+def noisy(text, rng):
+    chars = list(text)
+    for _ in range(rng.randint(0, 4)):
+        edit = rng.choice("sid")
+        position = rng.randrange(len(chars) + 1)
+        if edit == "i" or not chars:
+            chars.insert(position, rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ0158 "))
+        elif edit == "s":
+            chars[min(position, len(chars) - 1)] = rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ0158 ")
+        else:
+            del chars[min(position, len(chars) - 1)]
+    return "".join(chars)
+
+
+def noisy_line_sets(count=2000, seed=16):
+    rng = random.Random(seed)
+    targets = [target for vocab in VOCABULARIES for target in vocab.targets]
+    filler = ["CLASS OF VEHICLE", "FUEL TYPE", "MAKE", "", "A", "1500.00 CC", "ENGINE NO", "X" * 40]
+    for _ in range(count):
+        yield [noisy(rng.choice(targets + filler), rng) for _ in range(rng.randint(0, 8))]
+
+
+LINE_SETS = list(golden_line_sets()) + list(noisy_line_sets())
+
+
+@pytest.mark.skipif(vocabulary.cdist is None, reason="rapidfuzz is not installed")
+@pytest.mark.parametrize("vocab", VOCABULARIES, ids=lambda vocab: vocab.targets[0])
+def test_cdist_matches_reference(vocab):
+    for texts in LINE_SETS:
+        assert vocab.first_match(texts) == reference_first_match(vocab.targets, vocab.cutoff, texts), texts
+
+
+@pytest.mark.parametrize("vocab", VOCABULARIES, ids=lambda vocab: vocab.targets[0])
+def test_fuzzywuzzy_fallback_matches_reference(vocab, monkeypatch):
+    monkeypatch.setattr(vocabulary, "cdist", None)
+    monkeypatch.setattr(vocabulary, "fuzz", fuzzywuzzy_fuzz)
+    for texts in LINE_SETS:
+        assert vocab.first_match(texts) == reference_first_match(vocab.targets, vocab.cutoff, texts), texts
+
+
+def test_first_matches_per_text():
+    vocab = Vocabulary(["DIESEL", "PETROL"], cutoff=50)
+    assert vocab.first_matches(["PETR0L", "FUEL", "DIESEI", ""]) == ["PETROL", None, "DIESEL", None]
+    assert vocab.first_matches([]) == []
+    assert vocab.first_match(["FUEL TYPE", "DlESEL"]) == ("DlESEL", "DIESEL")